@@ -1,6 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Follow, Post, Comment
+from .models import User, Follow, Post, Comment, Job, Hashtag
+from .search import get_post_search
+
+# Admin search on post and comment text goes through the full-text index
+# instead of LIKE scans; search_fields only covers the username.
+ADMIN_SEARCH_LIMIT = 1000
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -19,11 +24,38 @@ class FollowAdmin(admin.ModelAdmin):
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ('author', 'created_at', 'like_count', 'comment_count')
-    search_fields = ('author__username', 'description')
+    search_fields = ('author__username',)
+    # Likes are written through board.relations, which keeps likes_count.
+    exclude = ('likes',)
     list_filter = ('created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            ids = get_post_search().post_ids(search_term, 0, ADMIN_SEARCH_LIMIT)
+            results |= queryset.filter(pk__in=ids)
+        return results, may_have_duplicates
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('post', 'author', 'created_at')
-    search_fields = ('author__username', 'content', 'post__id')
+    search_fields = ('author__username', 'post__id')
     list_filter = ('created_at',)
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            ids = get_post_search().comment_ids(search_term, 0, ADMIN_SEARCH_LIMIT)
+            results |= queryset.filter(pk__in=ids)
+        return results, may_have_duplicates
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('last_error',)
+
+@admin.register(Hashtag)
+class HashtagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'posts_count', 'created_at')
+    search_fields = ('name',)
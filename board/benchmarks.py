@@ -0,0 +1,286 @@
+import gc
+import json
+import logging
+import math
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .datasets import SyntheticData
+from .models import Post, User
+from .search import get_post_search, get_user_search
+from .search.posts import rebuild_tags
+from .timeline import rebuild_timeline
+
+BUDGETS_PATH = Path(__file__).with_name('benchmark_budgets.json')
+
+# Caches for a run: the views cache must not outlive it or leak into the
+# project's cache directory.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-default'},
+    'views': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-views'},
+}
+
+# Budgets written by --update-budgets are the measurement times this much,
+# and latencies at least LATENCY_SLACK_MS above it so a GC pause on a
+# one-millisecond page is not a regression; query counts are kept exact.
+HEADROOM = {'p50_ms': 2, 'p99_ms': 3, 'alloc_kb': 1.5}
+LATENCY_SLACK_MS = 20
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+IN_LIST_RE = re.compile(r'\((?:\?, )+\?\)')
+
+
+@contextmanager
+def environment():
+    # Caches and media for a run. seed() saves post images, which must not
+    # land in the project's MEDIA_ROOT any more than cached pages may outlive
+    # the run.
+    with tempfile.TemporaryDirectory() as media_root:
+        with override_settings(CACHES=CACHES, MEDIA_ROOT=media_root):
+            yield
+
+
+def latency_factor():
+    # Scales latency budgets for slower machines; query counts never scale.
+    return getattr(settings, 'BENCHMARK_LATENCY_FACTOR', 1)
+
+
+def fingerprint(sql):
+    return IN_LIST_RE.sub('(...)', LITERAL_RE.sub('?', sql))
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+class Subjects:
+    # The objects the scenarios request, picked from the seeded data so the
+    # busiest pages are the ones measured.
+
+    def __init__(self, viewer, author, post, query):
+        self.viewer = viewer
+        self.author = author
+        self.post = post
+        self.query = query
+
+
+def seed(users=300, follows=20, posts=3, likes=10, comments=2, seed=1):
+    end = timezone.make_aware(datetime(2025, 1, 1))
+    with transaction.atomic():
+        data = SyntheticData(seed=seed, batch_size=1000, end=end, prefix='bench')
+        data.users(users)
+        data.follows(follows)
+        data.posts(posts)
+        data.likes(likes)
+        data.comments(comments)
+        data.rebuild_counters()
+        get_user_search().rebuild()
+        get_post_search().rebuild()
+        rebuild_tags()
+
+        viewer = User.objects.filter(username__startswith='bench').order_by('-following_count', 'pk').first()
+        author = User.objects.exclude(pk=viewer.pk).order_by('-posts_count', 'pk').first()
+        post = Post.objects.order_by('-comments_count', '-likes_count', 'pk').first()
+        rebuild_timeline(viewer)
+    return Subjects(viewer, author, post, query=author.username[:len('bench') + 1])
+
+
+class Scenario:
+    def __init__(self, name, url, method='get', data=None, xhr=False, anonymous=False):
+        self.name = name
+        self.url = url
+        self.method = method
+        # A list of payloads is cycled through, so toggles alternate.
+        self.data = data or [{}]
+        self.xhr = xhr
+        self.anonymous = anonymous
+
+    def request(self, client, subjects, iteration):
+        headers = {'x-requested-with': 'XMLHttpRequest'} if self.xhr else {}
+        data = self.data[iteration % len(self.data)]
+        return getattr(client, self.method)(self.url(subjects), data, headers=headers)
+
+
+SCENARIOS = [
+    Scenario('post_list', lambda s: reverse('board:post_list')),
+    Scenario('post_list_anonymous', lambda s: reverse('board:post_list'), anonymous=True),
+    Scenario('home_feed', lambda s: reverse('board:home_feed')),
+    Scenario('feed', lambda s: reverse('board:feed')),
+    Scenario('post_detail', lambda s: reverse('board:post_detail', kwargs={'pk': s.post.pk})),
+    Scenario('user_detail', lambda s: reverse('board:user_detail', kwargs={'username': s.author.username})),
+    Scenario('user_comments', lambda s: reverse('board:api_user_comments', kwargs={'username': s.author.username})),
+    Scenario('user_search', lambda s: reverse('board:user_search') + f'?q={s.query}'),
+    Scenario(
+        'like_toggle', lambda s: reverse('board:post_like_toggle', kwargs={'pk': s.post.pk}),
+        method='post', data=[{'liked': '1'}, {'liked': '0'}], xhr=True,
+    ),
+    Scenario(
+        'follow_toggle', lambda s: reverse('board:user_follow_toggle', kwargs={'pk': s.author.pk}),
+        method='post', data=[{'following': '1'}, {'following': '0'}], xhr=True,
+    ),
+]
+
+
+class Result:
+    def __init__(self, name, queries, p50_ms, p99_ms, alloc_kb, repeated):
+        self.name = name
+        self.queries = queries
+        self.p50_ms = p50_ms
+        self.p99_ms = p99_ms
+        self.alloc_kb = alloc_kb
+        # Fingerprints run more than once by the request with the most
+        # queries, which is where an N+1 shows up.
+        self.repeated = repeated
+
+    def metrics(self):
+        return {'queries': self.queries, 'p50_ms': self.p50_ms, 'p99_ms': self.p99_ms, 'alloc_kb': self.alloc_kb}
+
+
+def measure(scenario, client, subjects, iterations=20, alloc_iterations=3):
+    def call(iteration):
+        response = scenario.request(client, subjects, iteration)
+        if response.status_code >= 400:
+            raise AssertionError(f'{scenario.name}: HTTP {response.status_code}')
+        return response
+
+    # Two warm-up calls: per-process caches fill on the first, the anonymous
+    # page cache stores the page on the second (see AnonymousPageCacheMixin).
+    call(0)
+    call(1)
+    timings, queries, repeated = [], 0, {}
+    # As timeit does: a collection landing in one request would be its p99.
+    gc.collect()
+    gc.disable()
+    try:
+        for iteration in range(2, iterations + 2):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                call(iteration)
+                timings.append((time.perf_counter() - started) * 1000)
+            if len(captured) >= queries:
+                queries = len(captured)
+                counts = Counter(fingerprint(query['sql']) for query in captured.captured_queries)
+                repeated = {sql: count for sql, count in counts.items() if count > 1}
+    finally:
+        gc.enable()
+
+    # Measured separately: tracing slows every allocation down.
+    peaks = []
+    tracemalloc.start()
+    try:
+        for iteration in range(iterations + 2, iterations + 2 + alloc_iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            call(iteration)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        scenario.name, queries, round(statistics.median(timings), 2), round(percentile(timings, 0.99), 2),
+        round(max(peaks) / 1024, 1), repeated,
+    )
+
+
+@contextmanager
+def quiet_requests():
+    # The per-request log line would flood the output; the middleware itself
+    # stays on so its cost is part of every budget.
+    request_log = logging.getLogger('board.instrumentation')
+    level = request_log.level
+    request_log.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        request_log.setLevel(level)
+
+
+def run(subjects, iterations=20, only=None):
+    signed_in = Client()
+    signed_in.force_login(subjects.viewer)
+    anonymous = Client()
+    with quiet_requests():
+        return [
+            measure(scenario, anonymous if scenario.anonymous else signed_in, subjects, iterations)
+            for scenario in SCENARIOS if not only or scenario.name in only
+        ]
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_budgets(results, path=BUDGETS_PATH):
+    budgets = load_budgets(path) if Path(path).exists() else {}
+    for result in results:
+        budget = {}
+        for metric, value in result.metrics().items():
+            if metric == 'queries':
+                budget[metric] = value
+                continue
+            budget[metric] = math.ceil(value * HEADROOM[metric])
+            if metric.endswith('_ms'):
+                budget[metric] = max(budget[metric], math.ceil(value + LATENCY_SLACK_MS))
+        budgets[result.name] = budget
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(budgets.items())), f, indent=2)
+        f.write('\n')
+
+
+class Row:
+    def __init__(self, name, metric, budget, actual, limit):
+        self.name = name
+        self.metric = metric
+        self.budget = budget
+        self.actual = actual
+        self.regressed = budget is None or actual > limit
+
+
+def compare(results, budgets):
+    rows = []
+    factor = latency_factor()
+    for result in results:
+        budget = budgets.get(result.name, {})
+        for metric, actual in result.metrics().items():
+            limit = budget.get(metric)
+            if limit is not None and metric in ('p50_ms', 'p99_ms'):
+                limit *= factor
+            rows.append(Row(result.name, metric, budget.get(metric), actual, limit))
+    return rows
+
+
+def report(rows, results):
+    lines = [f'{"view":<22}{"metric":<10}{"budget":>10}{"actual":>10}{"change":>10}']
+    for row in rows:
+        if row.budget is None:
+            change = 'нет бюджета'
+        else:
+            change = f'{row.actual - row.budget:+g}'
+        marker = '  РЕГРЕССИЯ' if row.regressed else ''
+        budget = '-' if row.budget is None else f'{row.budget:g}'
+        lines.append(f'{row.name:<22}{row.metric:<10}{budget:>10}{row.actual:>10g}{change:>10}{marker}')
+
+    by_name = {result.name: result for result in results}
+    for row in rows:
+        if row.metric == 'queries' and row.regressed and by_name[row.name].repeated:
+            lines.append('')
+            lines.append(f'{row.name}: повторяющиеся запросы')
+            for sql, count in sorted(by_name[row.name].repeated.items(), key=lambda item: -item[1]):
+                lines.append(f'  {count}× {sql[:200]}')
+    return '\n'.join(lines)
@@ -0,0 +1,219 @@
+import hashlib
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from .replicas import stale_window
+
+logger = logging.getLogger(__name__)
+
+POST_LIST = 'post_list'
+
+# Names passed to record(); listed so the performance page shows them at zero.
+CACHED_VIEWS = ('post_list', 'profile_header')
+
+
+def get_cache():
+    return caches[getattr(settings, 'VIEW_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'VIEW_CACHE_TIMEOUT', 600)
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def user_scope(username):
+    # Keyed by username so views can read the version before loading the user.
+    return f'user:{username}'
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def versions(scopes):
+    # A missing version starts at the current time in nanoseconds, so a version
+    # that was evicted never comes back with a value old entries were stored under.
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        found.update(cache.get_many(missing))
+    return [found.get(key) for key in keys]
+
+
+async def aversions(scopes):
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+        found.update(await cache.aget_many(missing))
+    return [found.get(key) for key in keys]
+
+
+def _bump(scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+class DelayedBumps:
+    # Second bumps for replica lag (see invalidate()), run by one thread per
+    # process however many writes schedule them. Scopes that fall due
+    # together are bumped once.
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._due = []
+        self._thread = None
+
+    def schedule(self, scopes, delay):
+        due = time.monotonic() + delay
+        with self._condition:
+            for scope in scopes:
+                heapq.heappush(self._due, (due, scope))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='board-cache-bumps', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _take_due(self):
+        with self._condition:
+            while not self._due or self._due[0][0] > time.monotonic():
+                self._condition.wait(self._due[0][0] - time.monotonic() if self._due else None)
+            now = time.monotonic()
+            scopes = set()
+            while self._due and self._due[0][0] <= now:
+                scopes.add(heapq.heappop(self._due)[1])
+            return scopes
+
+    def _run(self):
+        while True:
+            scopes = self._take_due()
+            try:
+                _bump(scopes)
+            except Exception:
+                logger.exception('Delayed bump of %s cache versions failed', len(scopes))
+
+
+delayed_bumps = DelayedBumps()
+
+
+def invalidate(*scopes):
+    # Bumped only after commit. Readers take versions before querying, so an
+    # entry stored under the old version can never hold data newer than the
+    # write it missed, and nothing reads the old version afterwards.
+    def bump():
+        _bump(scopes)
+        # With read replicas a reader can take the new version and still get
+        # the old rows from a lagging replica, caching them under it. A second
+        # bump once no replica in use can be that far behind drops them.
+        delay = stale_window()
+        if delay:
+            delayed_bumps.schedule(scopes, delay)
+    transaction.on_commit(bump)
+
+
+def make_key(name, *parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'view:{name}:{digest}'
+
+
+class HitCounts:
+    # Hits and misses of this process since it started, as for the request
+    # timings in board.instrumentation: recording a hit must not cost a cache
+    # round trip of its own.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, name, hit):
+        with self._lock:
+            self._counts[name, hit] += 1
+
+    def summary(self, names=CACHED_VIEWS):
+        with self._lock:
+            return {name: (self._counts[name, True], self._counts[name, False]) for name in names}
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+hit_counts = HitCounts()
+
+
+def record(name, hit):
+    hit_counts.record(name, hit)
+
+
+def stats(names=CACHED_VIEWS):
+    return hit_counts.summary(names)
+
+
+class AnonymousPageCacheMixin:
+    # Whole-page cache for anonymous visitors. get_cache_scopes() names what
+    # decides the page's structure (which objects are on it) and is known up
+    # front; get_cache_dependencies() names the objects rendered into it and is
+    # only known after a render, so it is remembered per structure version and
+    # keys the page from the next request on.
+    cache_name = None
+
+    def get_cache_scopes(self):
+        return []
+
+    def get_cache_dependencies(self, context):
+        return []
+
+    async def get(self, request, *args, **kwargs):
+        # For async views; the render happens here, in a worker thread, because
+        # the content is needed before the response leaves the view.
+        if self.cache_name is None or request.user.is_authenticated:
+            return await super().get(request, *args, **kwargs)
+
+        cache = get_cache()
+        path = request.get_full_path()
+        dependencies_key = make_key(self.cache_name, 'dependencies', path, await aversions(self.get_cache_scopes()))
+        dependencies = await cache.aget(dependencies_key)
+        page_key = None
+        if dependencies is not None:
+            page_key = make_key(self.cache_name, 'page', path, await aversions(dependencies))
+            content = await cache.aget(page_key)
+            if content is not None:
+                record(self.cache_name, hit=True)
+                return HttpResponse(content)
+
+        record(self.cache_name, hit=False)
+        response = await super().get(request, *args, **kwargs)
+        if response.status_code != 200 or not hasattr(response, 'render'):
+            return response
+        rendered = self.get_cache_dependencies(response.context_data)
+        await sync_to_async(response.render)()
+
+        entries = {dependencies_key: rendered}
+        if page_key is not None and rendered == dependencies:
+            entries[page_key] = response.content
+        await cache.aset_many(entries, cache_timeout())
+        return response
@@ -0,0 +1,176 @@
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, close_old_connections, connections
+from django.utils import timezone
+
+from . import relations
+from .benchmarks import percentile
+from .datasets import SyntheticData
+from .models import Comment, Post, User
+from .publishing import publish_comment
+
+# What Django gives a bare sqlite3 DATABASES entry.
+STOCK = {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+def configured():
+    # The project's own settings for the default database, minus the file.
+    settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+    return {key: settings_dict[key] for key in STOCK}
+
+
+def _use(settings_dict):
+    connections.close_all()
+    connections.settings[DEFAULT_DB_ALIAS] = settings_dict
+    # This thread's wrapper, if it has one, still holds the old settings.
+    try:
+        del connections[DEFAULT_DB_ALIAS]
+    except AttributeError:
+        pass
+
+
+@contextmanager
+def database(path, overrides):
+    # Points the default alias at another file, for every thread that opens a
+    # connection inside the block.
+    original = connections.settings[DEFAULT_DB_ALIAS]
+    _use({**original, 'NAME': str(path), **overrides})
+    try:
+        yield
+    finally:
+        _use(original)
+
+
+def prepare(path, users, seed=1):
+    # Schema and data, written once with stock settings and copied per mode,
+    # so every mode starts from the same file.
+    with database(path, STOCK):
+        call_command('migrate', verbosity=0)
+        data = SyntheticData(seed=seed, batch_size=1000, end=timezone.make_aware(datetime(2025, 1, 1)))
+        data.users(users)
+        data.follows(10)
+        data.posts(3)
+        data.likes(5)
+        data.comments(2)
+        data.rebuild_counters()
+
+
+class Result:
+    def __init__(self, mode, seconds):
+        self.mode = mode
+        self.seconds = seconds
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.write_ms = []
+        self._lock = threading.Lock()
+
+    def add(self, kind, elapsed_ms=None, failed=False):
+        with self._lock:
+            if failed:
+                self.errors += 1
+            elif kind == 'read':
+                self.reads += 1
+            else:
+                self.writes += 1
+                self.write_ms.append(elapsed_ms)
+
+
+class Workload:
+    # Readers fetch a post grid page and a comment thread; writers toggle
+    # likes and add comments through the same code as the views. After each
+    # operation the thread does what the end of a request does with its
+    # connection (close_old_connections), so CONN_MAX_AGE has its effect.
+
+    def __init__(self, readers=8, writers=4, seconds=10, seed=1):
+        self.readers = readers
+        self.writers = writers
+        self.seconds = seconds
+        self.seed = seed
+
+    def run(self, mode, path, overrides):
+        with database(path, overrides):
+            users = list(User.objects.order_by('pk')[:200])
+            post_ids = list(Post.objects.values_list('pk', flat=True))
+            connections.close_all()
+
+            result = Result(mode, self.seconds)
+            deadline = time.monotonic() + self.seconds
+            threads = [
+                threading.Thread(target=self._loop, args=(self._read, result, deadline, users, post_ids, i))
+                for i in range(self.readers)
+            ] + [
+                threading.Thread(target=self._loop, args=(self._write, result, deadline, users, post_ids, i))
+                for i in range(self.readers, self.readers + self.writers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return result
+
+    def _loop(self, operation, result, deadline, users, post_ids, number):
+        rng = random.Random(self.seed * 1000 + number)
+        try:
+            while time.monotonic() < deadline:
+                kind = 'read' if operation == self._read else 'write'
+                started = time.perf_counter()
+                try:
+                    operation(rng, users, post_ids)
+                except OperationalError:
+                    result.add(kind, failed=True)
+                else:
+                    result.add(kind, (time.perf_counter() - started) * 1000)
+                close_old_connections()
+        finally:
+            connections.close_all()
+
+    def _read(self, rng, users, post_ids):
+        list(Post.objects.select_related('author').order_by('-created_at', '-id')[:12])
+        list(
+            Comment.objects.filter(post_id=rng.choice(post_ids)).select_related('author')
+            .order_by('created_at', 'id')[:20]
+        )
+
+    def _write(self, rng, users, post_ids):
+        user, post_id = rng.choice(users), rng.choice(post_ids)
+        if rng.random() < 0.7:
+            relations.apply_likes({(user.pk, post_id): rng.random() < 0.5})
+        else:
+            publish_comment(Comment(post_id=post_id, author=user, content='Нагрузочный комментарий'))
+
+
+def compare(modes, users=300, **workload):
+    # modes: [(name, overrides)]. Each mode runs on its own copy of one
+    # prepared database file.
+    workload = Workload(**workload)
+    with tempfile.TemporaryDirectory() as directory:
+        template = Path(directory) / 'template.sqlite3'
+        prepare(template, users)
+        results = []
+        for name, overrides in modes:
+            path = Path(directory) / f'{name}.sqlite3'
+            shutil.copyfile(template, path)
+            results.append(workload.run(name, path, overrides))
+    return results
+
+
+def report(results):
+    lines = [f'{"mode":<10}{"reads/s":>10}{"writes/s":>10}{"write p50":>11}{"write p99":>11}{"errors":>8}']
+    for result in results:
+        p50 = statistics.median(result.write_ms) if result.write_ms else 0
+        p99 = percentile(result.write_ms, 0.99) if result.write_ms else 0
+        lines.append(
+            f'{result.mode:<10}{result.reads / result.seconds:>10.0f}{result.writes / result.seconds:>10.0f}'
+            f'{p50:>9.1f}ms{p99:>9.1f}ms{result.errors:>8}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,47 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import User, Follow, Post, Comment, Hashtag, PostHashtag
+
+
+# (model, counter field, related model, fk on the related model pointing back)
+COUNTERS = [
+    (Post, 'likes_count', Post.likes.through, 'post'),
+    (Post, 'comments_count', Comment, 'post'),
+    (User, 'posts_count', Post, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+    (User, 'following_count', Follow, 'follower'),
+    (User, 'comments_count', Comment, 'author'),
+    (Hashtag, 'posts_count', PostHashtag, 'hashtag'),
+]
+
+
+def bump(model, pk, **deltas):
+    # Must be called inside the transaction that wrote the related rows.
+    return model.objects.filter(pk=pk).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def actual_count(related_model, fk):
+    counts = (
+        related_model.objects
+        .filter(**{fk: OuterRef('pk')})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def find_stale(model, field, related_model, fk):
+    return (
+        model.objects
+        .annotate(actual=actual_count(related_model, fk))
+        .exclude(**{field: F('actual')})
+    )
+
+
+def rebuild(model, field, related_model, fk):
+    return model.objects.update(**{field: actual_count(related_model, fk)})
@@ -0,0 +1,352 @@
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from .counters import COUNTERS, rebuild
+from .models import Comment, Follow, Hashtag, MediaBlob, Mention, Post, PostHashtag, User
+from .storage import media_storage
+
+# Everything else (timelines, suggestions, search tables) is derived and
+# rebuilt by its own command after an import.
+EXPORT_MODELS = [MediaBlob, User, Follow, Post, Post.likes.through, Comment, Hashtag, PostHashtag, Mention]
+
+# Fields whose JSON form is a string that has to be parsed back.
+PARSED_FIELDS = (models.DateTimeField, models.DateField, models.TimeField, models.UUIDField, models.DecimalField)
+
+WORDS = (
+    'сегодня', 'город', 'кофе', 'закат', 'море', 'друзья', 'работа', 'проект', 'выходные', 'музыка',
+    'книга', 'прогулка', 'утро', 'фото', 'осень', 'лето', 'горы', 'дождь', 'кот', 'ужин',
+    'новый', 'лучший', 'наконец', 'снова', 'очень', 'красиво', 'вкусно', 'долго', 'вместе', 'дома',
+)
+TAGS = ('travel', 'food', 'photo', 'nature', 'city', 'music', 'art', 'sport', 'books', 'cats')
+PLACEHOLDER_NAME = 'placeholder.png'
+
+
+@contextmanager
+def explicit_timestamps(*model_classes):
+    # bulk_create runs pre_save, which replaces auto_now/auto_now_add values
+    # with the current time; generated and imported rows bring their own.
+    fields = [
+        field for model in model_classes for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def power_law(rng, size, mean, exponent, cap):
+    # Integers with density ~ x^-exponent (exponent > 2 for a finite mean):
+    # most values small, a few very large. The cap trims the mean slightly.
+    if mean <= 0 or size == 0:
+        return np.zeros(size, dtype=np.int64)
+    shape = exponent - 1
+    scale = mean * (shape - 1) / shape
+    values = np.floor((rng.pareto(shape, size) + 1) * scale)
+    return np.minimum(values, cap).astype(np.int64)
+
+
+class Popularity:
+    # Samples positions with Zipf weights over a random ranking, so picks
+    # concentrate on a few popular items the way follows and likes do.
+
+    def __init__(self, rng, size, exponent):
+        self.rng = rng
+        self.ranking = rng.permutation(size)
+        weights = np.arange(1, size + 1, dtype=np.float64) ** -exponent
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+
+    def sample(self, count):
+        positions = np.searchsorted(self.cdf, self.rng.random(count), side='right')
+        return self.ranking[np.minimum(positions, len(self.ranking) - 1)]
+
+
+def _unique_pairs(left, right, size):
+    keys = np.unique(left * size + right)
+    left, right = np.divmod(keys, size)
+    return left, right
+
+
+def _placeholder_png():
+    buffer = BytesIO()
+    Image.new('RGB', (640, 640), (222, 226, 230)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class SyntheticData:
+    # Writes a synthetic social graph in bulk_create batches. Only ids and
+    # timestamps are kept between stages (as numpy arrays, 16 bytes a row);
+    # edges, posts and comments are generated and written one block at a time.
+    # The same seed and end date on the same database state produce the same
+    # data.
+
+    def __init__(self, seed=0, batch_size=5000, days=365, end=None, prefix='load', password='password', log=None):
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.password = password
+        self.log = log or (lambda message: None)
+        self.now = end or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.now - timedelta(days=days)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.post_ids = np.empty(0, dtype=np.int64)
+        self.post_times = np.empty(0, dtype=np.float64)
+
+    def _times(self, count, after=None):
+        # Seconds since self.start, uniform over the window (or after `after`).
+        span = (self.now - self.start).total_seconds()
+        if after is None:
+            return self.rng.random(count) * span
+        return after + self.rng.random(count) * (span - after)
+
+    def _datetime(self, seconds):
+        return self.start + timedelta(seconds=float(seconds))
+
+    def _texts(self, count, min_words, max_words, tag_share):
+        lengths = self.rng.integers(min_words, max_words + 1, count)
+        words = self.rng.integers(len(WORDS), size=int(lengths.sum()))
+        tags = self.rng.integers(len(TAGS), size=count)
+        tagged = self.rng.random(count) < tag_share
+        texts, offset = [], 0
+        for length, tag, has_tag in zip(lengths.tolist(), tags.tolist(), tagged.tolist()):
+            text = ' '.join(WORDS[word] for word in words[offset:offset + length].tolist()).capitalize()
+            if has_tag:
+                text += f' #{TAGS[tag]}'
+            texts.append(text)
+            offset += length
+        return texts
+
+    def users(self, count):
+        # One hash for everybody: hashing a million passwords would take hours.
+        password = make_password(self.password)
+        ids = []
+        with explicit_timestamps(User):
+            for start in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - start)
+                joined = self._times(size)
+                bios = self._texts(size, 0, 8, 0)
+                batch = [
+                    User(
+                        username=f'{self.prefix}{start + i}', email=f'{self.prefix}{start + i}@example.com',
+                        password=password, date_joined=self._datetime(joined[i]), bio=bios[i],
+                    )
+                    for i in range(size)
+                ]
+                User.objects.bulk_create(batch)
+                ids.extend(user.pk for user in batch)
+                self.log(f'Пользователи: {start + size}/{count}')
+        self.user_ids = np.asarray(ids, dtype=np.int64)
+        return len(ids)
+
+    def _write(self, model, make, *columns):
+        # Builds instances from parallel numpy columns one batch at a time, so
+        # at most batch_size of them are alive. Returns their primary keys.
+        ids = []
+        for start in range(0, len(columns[0]), self.batch_size):
+            batch = [make(*row) for row in zip(*(column[start:start + self.batch_size] for column in columns))]
+            model.objects.bulk_create(batch)
+            ids.extend(obj.pk for obj in batch)
+        return ids
+
+    def follows(self, mean, exponent=2.5, popularity=0.8, limit=5000):
+        size = len(self.user_ids)
+        if size < 2:
+            return 0
+        targets = Popularity(self.rng, size, popularity)
+        written = 0
+        with explicit_timestamps(Follow):
+            for start in range(0, size, self.batch_size):
+                block = np.arange(start, min(start + self.batch_size, size))
+                degrees = power_law(self.rng, len(block), mean, exponent, min(limit, size - 1))
+                followers, following = _unique_pairs(
+                    np.repeat(block, degrees), targets.sample(int(degrees.sum())), size,
+                )
+                keep = followers != following
+                followers, following = self.user_ids[followers[keep]], self.user_ids[following[keep]]
+                self._write(
+                    Follow,
+                    lambda a, b, t: Follow(follower_id=a, following_id=b, created_at=self._datetime(t)),
+                    followers.tolist(), following.tolist(), self._times(len(followers)).tolist(),
+                )
+                written += len(followers)
+                self.log(f'Подписки: {written}')
+        return written
+
+    def posts(self, mean, exponent=2.5, limit=1000):
+        if not len(self.user_ids):
+            return 0
+        storage = media_storage()
+        image = storage.save(f'posts/{self.prefix}/{PLACEHOLDER_NAME}', ContentFile(_placeholder_png()))
+        authors = np.repeat(self.user_ids, power_law(self.rng, len(self.user_ids), mean, exponent, limit))
+        created = self._times(len(authors))
+        ids = []
+        with explicit_timestamps(Post):
+            for start in range(0, len(authors), self.batch_size):
+                end = start + self.batch_size
+                ids += self._write(
+                    Post,
+                    lambda author, text, t: Post(
+                        author_id=author, image=image, description=text, created_at=self._datetime(t),
+                    ),
+                    authors[start:end].tolist(), self._texts(len(authors[start:end]), 2, 25, 0.3),
+                    created[start:end].tolist(),
+                )
+                self.log(f'Посты: {len(ids)}/{len(authors)}')
+
+        # Every post shares the placeholder; count each reference so deleting
+        # one of them does not remove the file from under the rest.
+        if not ids:
+            storage.delete(image)
+        elif getattr(storage, 'content_addressed', False):
+            MediaBlob.objects.filter(name=image).update(refcount=F('refcount') + len(ids) - 1)
+        self.post_ids = np.asarray(ids, dtype=np.int64)
+        self.post_times = created
+        return len(ids)
+
+    def likes(self, mean, exponent=2.5, popularity=1.0, limit=5000):
+        posts = len(self.post_ids)
+        if not posts:
+            return 0
+        targets = Popularity(self.rng, posts, popularity)
+        Like = Post.likes.through
+        written = 0
+        for start in range(0, len(self.user_ids), self.batch_size):
+            block = np.arange(start, min(start + self.batch_size, len(self.user_ids)))
+            degrees = power_law(self.rng, len(block), mean, exponent, min(limit, posts))
+            users, liked = _unique_pairs(np.repeat(block, degrees), targets.sample(int(degrees.sum())), posts)
+            self._write(
+                Like, lambda user, post: Like(user_id=user, post_id=post),
+                self.user_ids[users].tolist(), self.post_ids[liked].tolist(),
+            )
+            written += len(users)
+            self.log(f'Лайки: {written}')
+        return written
+
+    def comments(self, mean, popularity=1.0):
+        posts = len(self.post_ids)
+        if not posts:
+            return 0
+        count = int(mean * posts)
+        targets = Popularity(self.rng, posts, popularity)
+        written = 0
+        with explicit_timestamps(Comment):
+            for start in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - start)
+                post_rows = targets.sample(size)
+                authors = self.user_ids[self.rng.integers(len(self.user_ids), size=size)]
+                self._write(
+                    Comment,
+                    lambda post, author, text, t: Comment(
+                        post_id=post, author_id=author, content=text, created_at=self._datetime(t),
+                    ),
+                    self.post_ids[post_rows].tolist(), authors.tolist(), self._texts(size, 1, 12, 0.05),
+                    self._times(size, after=self.post_times[post_rows]).tolist(),
+                )
+                written += size
+                self.log(f'Комментарии: {written}/{count}')
+        return written
+
+    def rebuild_counters(self):
+        for model, field, related_model, fk in COUNTERS:
+            with transaction.atomic():
+                rebuild(model, field, related_model, fk)
+
+
+@contextmanager
+def open_dump(path, mode):
+    # '-' is stdin/stdout; a .gz suffix compresses.
+    if path == '-':
+        yield sys.stdout if 'w' in mode else sys.stdin
+    elif path.endswith('.gz'):
+        with gzip.open(path, mode + 't', encoding='utf-8') as stream:
+            yield stream
+    else:
+        with open(path, mode, encoding='utf-8') as stream:
+            yield stream
+
+
+def export_rows(stream, model_classes=EXPORT_MODELS, chunk_size=5000):
+    # JSON lines: a {"model", "columns"} header per model, then one array of
+    # column values per row. Rows are streamed with iterator(), so memory
+    # does not grow with the table.
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    counts = {}
+    for model in model_classes:
+        label = model._meta.label_lower
+        columns = [field.attname for field in model._meta.concrete_fields]
+        stream.write(encoder.encode({'model': label, 'columns': columns}) + '\n')
+        rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+        counts[label] = 0
+        for row in rows:
+            stream.write(encoder.encode(row) + '\n')
+            counts[label] += 1
+    return counts
+
+
+def import_rows(stream, batch_size=5000, log=None):
+    # Loads an export_rows() dump with bulk_create in batches, in one
+    # transaction: either the whole dump loads or nothing does. Meant for an
+    # empty, migrated database; unlike loaddata it does not save() row by row
+    # and sends no signals.
+    log = log or (lambda message: None)
+    counts = {}
+    loaded = set()
+    model, columns, parsers, batch = None, [], {}, []
+
+    def flush():
+        if batch:
+            model.objects.bulk_create(batch)
+            counts[model._meta.label_lower] += len(batch)
+            log(f'{model._meta.label_lower}: {counts[model._meta.label_lower]}')
+            batch.clear()
+
+    with transaction.atomic(), explicit_timestamps(*apps.get_models(include_auto_created=True)):
+        for line in stream:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                flush()
+                model = apps.get_model(item['model'])
+                columns = item['columns']
+                fields = {field.attname: field for field in model._meta.concrete_fields}
+                parsers = {
+                    position: fields[column].to_python for position, column in enumerate(columns)
+                    if isinstance(fields[column], PARSED_FIELDS)
+                }
+                counts.setdefault(model._meta.label_lower, 0)
+                loaded.add(model)
+                continue
+            for position, parse in parsers.items():
+                if item[position] is not None:
+                    item[position] = parse(item[position])
+            batch.append(model(**dict(zip(columns, item))))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        # Explicit primary keys leave PostgreSQL sequences behind.
+        statements = connection.ops.sequence_reset_sql(no_style(), list(loaded))
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+    return counts
@@ -0,0 +1,150 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Follow, Post
+from .pagination import CursorPaginator, InvalidCursor
+
+FOLLOWED = 'f'
+OTHERS = 'o'
+
+
+def recency_score(post, now):
+    return post.created_at.timestamp()
+
+
+def engagement_score(post, now):
+    # Hacker News style gravity: engagement decays with the age in hours.
+    age_hours = max((now - post.created_at).total_seconds() / 3600, 0)
+    engagement = post.likes_count + 2 * post.comments_count
+    return (engagement + 1) / (age_hours + 2) ** 1.5
+
+
+def get_scorer():
+    return import_string(getattr(settings, 'FEED_SCORER', 'board.feed.recency_score'))
+
+
+def candidate_window():
+    return getattr(settings, 'FEED_WINDOW_SIZE', 120)
+
+
+class FeedPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = None
+        self.approximate_total = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return False
+
+    def has_other_pages(self):
+        return self.has_next()
+
+
+class FeedCursor:
+    # Position in a MergedFeed: the part, the keyset cursor where the current
+    # window starts, the time the window is scored at, and the (score, id) of
+    # the last post served from it.
+
+    def __init__(self, part=FOLLOWED, window='', scored_at=None, after=None):
+        self.part = part
+        self.window = window
+        self.scored_at = scored_at if scored_at is not None else timezone.now().timestamp()
+        self.after = after
+
+    def encode(self):
+        raw = json.dumps([self.part, self.window, self.scored_at, self.after], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            part, window, scored_at, after = json.loads(raw)
+        except (binascii.Error, ValueError, TypeError):
+            raise InvalidCursor(token)
+        if (
+            part not in (FOLLOWED, OTHERS) or not isinstance(window, str)
+            or not isinstance(scored_at, (int, float))
+            or not (after is None or (isinstance(after, list) and len(after) == 2
+                                      and all(isinstance(v, (int, float)) for v in after)))
+        ):
+            raise InvalidCursor(token)
+        return cls(part, window, scored_at, after)
+
+
+class MergedFeed:
+    # Posts from followed authors first, then everyone else. Each part is read
+    # newest first in windows of window_size posts with its own keyset cursor,
+    # so no request sorts more than a window. The scorer orders the posts of a
+    # window, and pages continue from the (score, id) of the last post shown,
+    # scored at the time the window was first served, so a post ranks the
+    # same whichever page it falls on.
+
+    def __init__(self, user, scorer=None, window_size=None):
+        self.user = user
+        self.scorer = scorer or get_scorer()
+        self.window_size = window_size or candidate_window()
+
+    def followed_posts(self):
+        followed = Follow.objects.filter(follower=self.user).values('following')
+        return Post.objects.for_grid(self.user).filter(author__in=followed)
+
+    def other_posts(self):
+        followed = Follow.objects.filter(follower=self.user).values('following')
+        return Post.objects.for_grid(self.user).exclude(author__in=followed)
+
+    def _window(self, position):
+        now = datetime.fromtimestamp(position.scored_at, tz=dt_timezone.utc)
+        queryset = self.followed_posts() if position.part == FOLLOWED else self.other_posts()
+        # Posts published after the first page don't shift the windows.
+        paginator = CursorPaginator(queryset.filter(created_at__lte=now), self.window_size)
+        window = paginator.get_page(position.window)
+        ranked = sorted(
+            ([self.scorer(post, now), post.pk, post] for post in window),
+            key=lambda item: item[:2], reverse=True,
+        )
+        if position.after is not None:
+            ranked = [item for item in ranked if item[:2] < position.after]
+        return ranked, window.next_cursor
+
+    def page(self, cursor, per_page):
+        try:
+            position = FeedCursor.decode(cursor) if cursor else FeedCursor()
+        except InvalidCursor:
+            position = FeedCursor()
+
+        posts = []
+        while True:
+            ranked, next_window = self._window(position)
+            taken = ranked[:per_page - len(posts)]
+            posts += [post for _, _, post in taken]
+            if len(taken) < len(ranked):
+                position.after = taken[-1][:2]
+                return FeedPage(posts, position.encode())
+            if next_window:
+                position = FeedCursor(position.part, next_window, position.scored_at)
+            elif position.part == FOLLOWED:
+                position = FeedCursor(OTHERS, '', position.scored_at)
+            else:
+                return FeedPage(posts, None)
+            if len(posts) == per_page:
+                return FeedPage(posts, position.encode())
@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .caching import user_scope, versions
+from .models import Follow
+
+
+class FollowingCache:
+    # Process-wide LRU of user id -> (version, following ids). Entries are
+    # tagged with the user's board.caching version, which ToggleFollowView
+    # bumps, so other processes drop their copy on the next lookup.
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, version, following_ids):
+        if not self.size:
+            return
+        with self._lock:
+            self._entries[user_id] = (version, following_ids)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+following_cache = FollowingCache(getattr(settings, 'SOCIAL_GRAPH_CACHE_SIZE', 10000))
+
+
+def full_set_limit():
+    return getattr(settings, 'SOCIAL_GRAPH_FULL_SET_LIMIT', 5000)
+
+
+class SocialGraph:
+    # Follow state of one viewer, memoized for the lifetime of the object
+    # (one request, see get_graph()). Batch lookups cost one query; once the
+    # viewer's whole following set is loaded, lookups cost none.
+
+    def __init__(self, user):
+        self.user = user
+        self._following = None
+        self._known = {}
+        self._version = None
+
+    def _load_cached(self):
+        # At most one version lookup per request.
+        if self._following is not None or self._version is not None or not following_cache.size:
+            return
+        self._version, = versions([user_scope(self.user.username)])
+        self._following = following_cache.get(self.user.pk, self._version)
+
+    def following_ids(self):
+        if not self.user.is_authenticated:
+            return frozenset()
+        self._load_cached()
+        if self._following is None:
+            self._following = frozenset(
+                Follow.objects.filter(follower=self.user).values_list('following_id', flat=True)
+            )
+            if following_cache.size:
+                following_cache.set(self.user.pk, self._version, self._following)
+        return self._following
+
+    def prefetch(self, user_ids):
+        if not self.user.is_authenticated:
+            return
+        self._load_cached()
+        if self._following is not None:
+            return
+        if following_cache.size and self.user.following_count <= full_set_limit():
+            # Small enough to load whole and keep for later requests.
+            self.following_ids()
+            return
+        missing = {pk for pk in user_ids if pk not in self._known}
+        if not missing:
+            return
+        followed = set(
+            Follow.objects
+            .filter(follower=self.user, following_id__in=missing)
+            .values_list('following_id', flat=True)
+        )
+        self._known.update((pk, pk in followed) for pk in missing)
+
+    def follows_many(self, user_ids):
+        user_ids = list(user_ids)
+        if not self.user.is_authenticated:
+            return dict.fromkeys(user_ids, False)
+        self.prefetch(user_ids)
+        if self._following is not None:
+            return {pk: pk in self._following for pk in user_ids}
+        return {pk: self._known[pk] for pk in user_ids}
+
+    def follows(self, user_id):
+        return self.follows_many([user_id])[user_id]
+
+    def invalidate(self):
+        self._following = None
+        self._version = None
+        self._known.clear()
+        if self.user.is_authenticated:
+            following_cache.discard(self.user.pk)
+
+
+def get_graph(request):
+    graph = getattr(request, '_social_graph', None)
+    if graph is None or graph.user != request.user:
+        graph = request._social_graph = SocialGraph(request.user)
+    return graph
@@ -0,0 +1,140 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .instrumentation import timed
+from .models import Post, User
+
+VARIANT_FORMATS = {
+    'avif': {'format': 'AVIF', 'quality': 55},
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 4},
+}
+
+# Widths cover the card/detail sizes in the templates at 1x and 2x.
+POST_WIDTHS = getattr(settings, 'POST_IMAGE_WIDTHS', (320, 640, 1080))
+AVATAR_WIDTHS = getattr(settings, 'AVATAR_IMAGE_WIDTHS', (48, 100, 200))
+
+ORIENTATION_TAG = 0x0112
+
+
+def variant_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{fmt}'
+
+
+def _load(field_file):
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    finally:
+        field_file.close()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+@timed('storage')
+def strip_metadata(field_file):
+    # Re-encodes the original without EXIF (GPS, camera serials) after
+    # applying the orientation tag. Returns True if the file was rewritten.
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        fmt = image.format
+        if not image.getexif():
+            return False
+        image = ImageOps.exif_transpose(image)
+        buffer = BytesIO()
+        options = {'quality': 90} if fmt == 'JPEG' else {}
+        image.save(buffer, format=fmt, **options)
+    finally:
+        field_file.close()
+
+    storage = field_file.storage
+    storage.delete(field_file.name)
+    field_file.name = storage.save(field_file.name, ContentFile(buffer.getvalue()))
+    return True
+
+
+def _resize(image, width, square):
+    if square:
+        return ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def delete_variants(storage, variants):
+    for names in variants.values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def _oriented_size(field_file):
+    # Reads only the header; EXIF orientations 5-8 swap width and height.
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        width, height = image.size
+        if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+            width, height = height, width
+    finally:
+        field_file.close()
+    return width, height
+
+
+def _target_widths(original_width, widths, square):
+    if square:
+        return list(widths)
+    targets = [min(width, original_width) for width in widths if width <= original_width]
+    return targets or [min(widths[0], original_width)]
+
+
+@timed('storage')
+def generate_variants(field_file, widths, square=False):
+    storage = field_file.storage
+    content_addressed = getattr(storage, 'content_addressed', False)
+    targets = _target_widths(_oriented_size(field_file)[0], widths, square)
+    names = {
+        fmt: {str(width): variant_name(field_file.name, width, fmt) for width in targets}
+        for fmt in VARIANT_FORMATS
+    }
+    if content_addressed and all(storage.exists(name) for by_width in names.values() for name in by_width.values()):
+        # The same bytes were processed before: reuse the derivatives.
+        return names
+
+    image = _load(field_file)
+    variants = {fmt: {} for fmt in VARIANT_FORMATS}
+    for width in targets:
+        resized = _resize(image, width, square)
+        for fmt, options in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, **options)
+            name = names[fmt][str(width)]
+            save = storage.save_derivative if content_addressed else storage.save
+            storage.delete(name)
+            variants[fmt][str(width)] = save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def process_post_image(post):
+    if not post.image:
+        return {}
+    delete_variants(post.image.storage, post.image_variants)
+    post.image_variants = generate_variants(post.image, POST_WIDTHS)
+    Post.objects.filter(pk=post.pk).update(image_variants=post.image_variants)
+    return post.image_variants
+
+
+def process_avatar(user):
+    storage = user._meta.get_field('avatar').storage
+    delete_variants(storage, user.avatar_variants)
+    user.avatar_variants = generate_variants(user.avatar, AVATAR_WIDTHS, square=True) if user.avatar else {}
+    User.objects.filter(pk=user.pk).update(avatar_variants=user.avatar_variants)
+    return user.avatar_variants
@@ -0,0 +1,241 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+
+_current = ContextVar('board_instrumentation', default=None)
+
+
+def sample_size():
+    return getattr(settings, 'INSTRUMENTATION_SAMPLES', 1000)
+
+
+def profile_rate():
+    return getattr(settings, 'INSTRUMENTATION_PROFILE_RATE', 0)
+
+
+def profiles_kept():
+    return getattr(settings, 'INSTRUMENTATION_PROFILES', 20)
+
+
+def normalize(sql):
+    # Django's SQL still has %s placeholders, so the text alone identifies the
+    # statement; only IN lists differ in length between calls.
+    return IN_LIST_RE.sub('(...)', sql)
+
+
+class Timings:
+    # What one request spent, filled in by the hooks below. Lives in a
+    # ContextVar so threads, async tasks and sync_to_async calls of the
+    # request all add to the same object.
+
+    def __init__(self):
+        self.spent = {'db': 0.0, 'template': 0.0, 'storage': 0.0}
+        self.queries = Counter()
+        self.active = Counter()
+
+    def duplicates(self):
+        duplicates = Counter()
+        for sql, count in self.queries.items():
+            if count > 1:
+                duplicates[normalize(sql)] += count
+        return duplicates
+
+
+@contextmanager
+def timed(kind):
+    # Usable as a decorator too. Nested sections of the same kind (a storage
+    # save inside variant generation) are counted once.
+    timings = _current.get()
+    if timings is None or timings.active[kind]:
+        yield
+        return
+    timings.active[kind] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spent[kind] += time.perf_counter() - started
+        timings.active[kind] -= 1
+
+
+def _execute(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.spent['db'] += time.perf_counter() - started
+        timings.queries[sql] += 1
+
+
+def _install_wrapper(connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+class RollingStats:
+    # The last sample_size() requests per view, plus duplicate-query counts
+    # and the most recent sampled profiles; everything in this process only.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._duplicates = {}
+        self._profiles = deque(maxlen=profiles_kept())
+
+    def add(self, view, sample, duplicates):
+        with self._lock:
+            samples = self._samples.get(view)
+            if samples is None:
+                samples = self._samples[view] = deque(maxlen=sample_size())
+            samples.append(sample)
+            if duplicates:
+                counter = self._duplicates.setdefault(view, Counter())
+                counter.update(duplicates)
+                if len(counter) > 200:
+                    self._duplicates[view] = Counter(dict(counter.most_common(100)))
+
+    def add_profile(self, view, total_ms, text):
+        with self._lock:
+            self._profiles.appendleft({'view': view, 'total_ms': total_ms, 'text': text, 'at': time.time()})
+
+    def summary(self):
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+            duplicates = {view: counter.most_common(5) for view, counter in self._duplicates.items()}
+            profiles = list(self._profiles)
+
+        views = []
+        for view, values in samples.items():
+            totals = sorted(sample['total_ms'] for sample in values)
+            views.append({
+                'view': view,
+                'requests': len(values),
+                'p50_ms': statistics.median(totals),
+                'p99_ms': totals[min(len(totals) - 1, int(len(totals) * 0.99))],
+                'db_ms': statistics.fmean(sample['db_ms'] for sample in values),
+                'template_ms': statistics.fmean(sample['template_ms'] for sample in values),
+                'storage_ms': statistics.fmean(sample['storage_ms'] for sample in values),
+                'queries': statistics.fmean(sample['queries'] for sample in values),
+                'duplicates': duplicates.get(view, []),
+            })
+        views.sort(key=lambda row: row['p99_ms'] * row['requests'], reverse=True)
+        return views, profiles
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._duplicates.clear()
+            self._profiles.clear()
+
+
+stats = RollingStats()
+
+
+def _profile_text(profile, limit=30):
+    buffer = io.StringIO()
+    pstats.Stats(profile, stream=buffer).sort_stats('cumulative').print_stats(limit)
+    return buffer.getvalue()
+
+
+class InstrumentationMiddleware:
+    # Times every request and splits it into DB, template and storage time;
+    # one structured log line per request plus the rolling aggregate behind
+    # the staff performance page. Costs a few microseconds per request and a
+    # counter update per query, so it stays on in production; cProfile runs
+    # only on the INSTRUMENTATION_PROFILE_RATE share of requests.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(_install_wrapper, weak=False, dispatch_uid='board_instrumentation')
+        for connection in connections.all(initialized_only=True):
+            _install_wrapper(connection)
+
+    def _start(self):
+        timings = Timings()
+        token = _current.set(timings)
+        profile = None
+        if profile_rate() and random.random() < profile_rate():
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None  # another profiler is already active
+        return timings, token, profile, time.perf_counter()
+
+    def _finish(self, request, response, timings, token, profile, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        _current.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+
+        if profile is not None:
+            profile.disable()
+            stats.add_profile(view, round(total_ms, 1), _profile_text(profile))
+
+        duplicates = timings.duplicates()
+        sample = {
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(timings.spent['db'] * 1000, 2),
+            'template_ms': round(timings.spent['template'] * 1000, 2),
+            'storage_ms': round(timings.spent['storage'] * 1000, 2),
+            'queries': sum(timings.queries.values()),
+            'duplicate_queries': sum(duplicates.values()),
+        }
+        stats.add(view, sample, duplicates)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(sample))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._start()
+        response = self.get_response(request)
+        return self._finish(request, response, *state)
+
+    async def __acall__(self, request):
+        state = self._start()
+        response = await self.get_response(request)
+        return self._finish(request, response, *state)
+
+    def process_template_response(self, request, response):
+        # Rendering starts once every process_template_response has run and
+        # ends with the post-render callbacks, so this brackets it exactly.
+        timings = _current.get()
+        if timings is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                timings.spent['template'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
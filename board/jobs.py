@@ -0,0 +1,83 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def handler(kind, on_failure=None):
+    # on_failure is called with the same payload once all attempts are used up.
+    def register(func):
+        _handlers[kind] = (func, on_failure)
+        return func
+    return register
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'JOBS_RETRY_BASE_DELAY', 5)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def enqueue(kind, **payload):
+    # The job row is written in the caller's transaction, so it only becomes
+    # visible to workers once the data it refers to is committed.
+    job = Job.objects.create(kind=kind, payload=payload)
+    if getattr(settings, 'JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_job(job.pk))
+    return job
+
+
+def claim(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects
+            .filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'pk')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(status=Job.RUNNING, locked_at=now)
+    return ids
+
+
+def requeue_stale(timeout):
+    cutoff = timezone.now() - timeout
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(status=Job.QUEUED, locked_at=None)
+
+
+def run_job(job_id):
+    job = Job.objects.get(pk=job_id)
+    func, on_failure = _handlers.get(job.kind, (None, None))
+    job.attempts += 1
+    try:
+        if func is None:
+            raise LookupError(f'Unknown job kind: {job.kind}')
+        func(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            logger.exception('Job %s failed permanently', job)
+            if on_failure:
+                on_failure(**job.payload)
+        else:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            logger.warning('Job %s failed, retry %s scheduled', job, job.attempts)
+    else:
+        job.status = Job.DONE
+        job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'attempts', 'run_after', 'locked_at', 'last_error'])
+    return job.status
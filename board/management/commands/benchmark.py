@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from board import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу синтетическими данными и замеряет число SQL-запросов, задержку p50/p99 '
+        'и выделения памяти основных страниц, сравнивая с бюджетами из board/benchmark_budgets.json'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300, help='Пользователей в тестовых данных')
+        parser.add_argument('--iterations', type=int, default=50, help='Замеров на страницу')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Только указанные сценарии')
+        parser.add_argument(
+            '--update-budgets', action='store_true',
+            help='Записать результаты как новые бюджеты вместо сравнения',
+        )
+
+    def handle(self, *args, users, iterations, only=None, update_budgets=False, **options):
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with benchmarks.environment():
+                subjects = benchmarks.seed(users=users)
+                results = benchmarks.run(subjects, iterations=iterations, only=only)
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        if update_budgets:
+            benchmarks.save_budgets(results)
+            self.stdout.write(f'Бюджеты записаны в {benchmarks.BUDGETS_PATH}')
+            return
+
+        rows = benchmarks.compare(results, benchmarks.load_budgets())
+        self.stdout.write(benchmarks.report(rows, results))
+        regressions = sum(row.regressed for row in rows)
+        if regressions:
+            raise CommandError(f'Превышено бюджетов: {regressions}')
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from board.models import UploadSession
+from board.uploads import discard
+
+
+class Command(BaseCommand):
+    help = 'Удаляет незавершённые загрузки, которые давно не обновлялись'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, hours, **options):
+        cutoff = timezone.now() - timedelta(hours=hours)
+        stale = UploadSession.objects.filter(status=UploadSession.OPEN, updated_at__lt=cutoff)
+        removed = 0
+        for session in stale.iterator():
+            discard(session)
+            session.delete()
+            removed += 1
+        UploadSession.objects.filter(status=UploadSession.COMPLETE, updated_at__lt=cutoff).delete()
+        self.stdout.write(f'Удалено загрузок: {removed}')
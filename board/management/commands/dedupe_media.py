@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from board.jobs import enqueue
+from board.models import Post
+from board.storage import is_blob
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Переносит изображения постов и аватары в хранилище с адресацией по содержимому, объединяя дубликаты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет перенесено')
+
+    def fold(self, obj, field_name, variants_field, job_kind, dry_run):
+        field_file = getattr(obj, field_name)
+        storage = field_file.storage
+        old_name = field_file.name
+        if not storage.exists(old_name):
+            self.stderr.write(f'{obj._meta.label} {obj.pk}: файл {old_name} не найден')
+            return None
+        if dry_run:
+            return old_name
+
+        with storage.open(old_name, 'rb') as content:
+            new_name = storage.save(old_name, content)
+
+        with transaction.atomic():
+            type(obj).objects.filter(pk=obj.pk).update(**{field_name: new_name, variants_field: {}})
+            enqueue(job_kind, **{f'{obj._meta.model_name}_id': obj.pk})
+
+        for names in getattr(obj, variants_field).values():
+            for name in names.values():
+                storage.delete(name)
+        return new_name
+
+    def handle(self, *args, dry_run=False, **options):
+        sources = (
+            (Post.objects.exclude(image=''), 'image', 'image_variants', 'process_post_image'),
+            (User.objects.exclude(avatar='').exclude(avatar__isnull=True), 'avatar', 'avatar_variants', 'process_avatar'),
+        )
+        moved = {}
+        for queryset, field_name, variants_field, job_kind in sources:
+            for obj in queryset.order_by('pk').iterator():
+                if is_blob(getattr(obj, field_name).name):
+                    continue
+                new_name = self.fold(obj, field_name, variants_field, job_kind, dry_run)
+                if new_name:
+                    moved[getattr(obj, field_name).name] = new_name
+
+        if dry_run:
+            self.stdout.write(f'Будет перенесено файлов: {len(moved)}')
+            return
+
+        # Old files are removed only after every row pointing at them moved.
+        storage = Post._meta.get_field('image').storage
+        for old_name in moved:
+            storage.delete(old_name)
+        self.stdout.write(f'Перенесено файлов: {len(moved)}, уникальных: {len(set(moved.values()))}')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from board import benchmarks, queryplans
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу синтетическими данными, выполняет EXPLAIN QUERY PLAN для запросов '
+        'основных страниц и сообщает о полных сканированиях таблиц и сортировках во временном B-дереве'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300, help='Пользователей в тестовых данных')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Только указанные сценарии')
+
+    def handle(self, *args, users, only=None, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Планы запросов разбираются только для SQLite')
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with benchmarks.environment():
+                subjects = benchmarks.seed(users=users)
+                findings = queryplans.check(subjects, only=only)
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        if findings:
+            self.stdout.write(queryplans.report(findings))
+            raise CommandError(f'Запросов с неудачным планом: {len(findings)}')
+        self.stdout.write('Все запросы используют индексы')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from board.datasets import export_rows, open_dump
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает пользователей, подписки, посты, лайки, комментарии и хэштеги в JSON Lines '
+        '(для import_data). Хэши паролей выгружаются как есть'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл (.gz — со сжатием) или - для stdout')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Строк за одно чтение из базы')
+
+    def handle(self, *args, path, chunk_size, **options):
+        started = time.monotonic()
+        with open_dump(path, 'w') as stream:
+            counts = export_rows(stream, chunk_size=chunk_size)
+        if path != '-':
+            for label, count in counts.items():
+                self.stdout.write(f'{label}: {count}')
+            self.stdout.write(f'Выгружено за {time.monotonic() - started:.1f} с')
@@ -0,0 +1,66 @@
+import time
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from board.datasets import SyntheticData
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочного тестирования: пользователей, подписки '
+        'со степенным распределением, посты, лайки и комментарии'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Сколько пользователей создать')
+        parser.add_argument('--follows', type=float, default=50, help='Подписок на пользователя в среднем')
+        parser.add_argument('--posts', type=float, default=5, help='Постов на пользователя в среднем')
+        parser.add_argument('--likes', type=float, default=30, help='Лайков на пользователя в среднем')
+        parser.add_argument('--comments', type=float, default=2, help='Комментариев на пост в среднем')
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней распределить даты')
+        parser.add_argument(
+            '--end', type=datetime.fromisoformat,
+            help='Дата последней активности (ГГГГ-ММ-ДД), по умолчанию начало сегодняшнего дня',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора случайных чисел')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Строк в одном bulk_create')
+        parser.add_argument('--prefix', default='load', help='Префикс имён пользователей')
+        parser.add_argument('--password', default='password', help='Пароль всех созданных пользователей')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Пользователи с префиксом «{prefix}» уже есть, укажите другой --prefix')
+
+        end = options['end']
+        if end is not None and timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        verbose = options['verbosity'] > 1
+        data = SyntheticData(
+            seed=options['seed'], batch_size=options['batch_size'], days=options['days'], end=end,
+            prefix=prefix, password=options['password'], log=self.stdout.write if verbose else None,
+        )
+        started = time.monotonic()
+        stages = [
+            ('Пользователей', lambda: data.users(options['users'])),
+            ('Подписок', lambda: data.follows(options['follows'])),
+            ('Постов', lambda: data.posts(options['posts'])),
+            ('Лайков', lambda: data.likes(options['likes'])),
+            ('Комментариев', lambda: data.comments(options['comments'])),
+        ]
+        for label, stage in stages:
+            stage_started = time.monotonic()
+            count = stage()
+            self.stdout.write(f'{label}: {count}, за {time.monotonic() - stage_started:.1f} с')
+
+        data.rebuild_counters()
+        self.stdout.write(f'Готово за {time.monotonic() - started:.1f} с')
+        self.stdout.write(
+            'Ленты, поиск и рекомендации: manage.py rebuild_timelines, rebuild_search_index, '
+            'refresh_suggestions --full'
+        )
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from board.images import process_post_image, process_avatar
+from board.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений постов и аватаров в форматах AVIF и WebP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Только для изображений без копий')
+
+    def handle(self, *args, missing=False, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        users = User.objects.exclude(avatar='').exclude(avatar__isnull=True).order_by('pk')
+        if missing:
+            posts = posts.filter(image_variants={})
+            users = users.filter(avatar_variants={})
+
+        for label, queryset, process in (('постов', posts, process_post_image), ('аватаров', users, process_avatar)):
+            done = failed = 0
+            for obj in queryset.iterator():
+                try:
+                    process(obj)
+                    done += 1
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f'{obj.pk}: {exc}')
+            self.stdout.write(f'Изображений {label}: обработано {done}, ошибок {failed}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from board.counters import COUNTERS, find_stale, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики лайков, комментариев, постов, подписок и хэштегов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить счётчики, ничего не изменяя',
+        )
+
+    def handle(self, *args, check=False, **options):
+        total_stale = 0
+        for model, field, related_model, fk in COUNTERS:
+            label = f'{model._meta.label}.{field}'
+            stale = find_stale(model, field, related_model, fk).count()
+            total_stale += stale
+
+            if check:
+                self.stdout.write(f'{label}: расхождений {stale}')
+                continue
+
+            with transaction.atomic():
+                updated = rebuild(model, field, related_model, fk)
+            self.stdout.write(f'{label}: пересчитано {updated}, исправлено {stale}')
+
+        if check and total_stale:
+            raise CommandError(f'Найдено расхождений: {total_stale}')
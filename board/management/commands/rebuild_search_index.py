@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from board.search import get_post_search, get_user_search
+from board.search.posts import rebuild_tags
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковые индексы пользователей, постов и комментариев, хэштеги и упоминания'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', choices=['users', 'posts'],
+            help='Перестроить только один индекс',
+        )
+
+    def handle(self, *args, only=None, **options):
+        if only in (None, 'users'):
+            with transaction.atomic():
+                indexed = get_user_search().rebuild()
+            self.stdout.write(f'Пользователей в индексе: {indexed}')
+
+        if only in (None, 'posts'):
+            with transaction.atomic():
+                indexed = get_post_search().rebuild()
+                hashtags = rebuild_tags()
+            self.stdout.write(f'Постов и комментариев в индексе: {indexed}')
+            self.stdout.write(f'Хэштегов: {hashtags}')
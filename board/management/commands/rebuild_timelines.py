@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from board.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет ленты подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Только указанные пользователи')
+
+    def handle(self, *args, usernames=None, **options):
+        users = User.objects.order_by('pk')
+        if usernames:
+            users = users.filter(username__in=usernames)
+
+        total = 0
+        for user in users.iterator():
+            with transaction.atomic():
+                total += rebuild_timeline(user)
+        self.stdout.write(f'Записей в лентах: {total}')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from board.suggestions import refresh, refresh_stale
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «Возможно, вы знакомы» по графу подписок и лайков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать для всех пользователей, а не только для изменившихся',
+        )
+
+    def handle(self, *args, full=False, **options):
+        started = time.monotonic()
+        users, written = refresh() if full else refresh_stale()
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Пользователей: {users}, рекомендаций: {written}, за {elapsed:.1f} с')
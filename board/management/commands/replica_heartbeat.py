@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from board import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет метку времени на основной базе, по которой измеряется отставание реплик; '
+        'с --copy-sqlite также копирует основную SQLite-базу в файлы реплик (для локальной разработки)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1, help='Секунд между обновлениями')
+        parser.add_argument('--once', action='store_true', help='Обновить один раз и выйти')
+        parser.add_argument('--copy-sqlite', action='store_true', help='Копировать основную базу в реплики')
+
+    def handle(self, *args, interval, once=False, copy_sqlite=False, **options):
+        if copy_sqlite:
+            for alias in [replicas.PRIMARY, *replicas.replicas()]:
+                if connections[alias].vendor != 'sqlite':
+                    raise CommandError(f'{alias}: --copy-sqlite работает только с SQLite')
+
+        while True:
+            replicas.beat()
+            if copy_sqlite:
+                for alias in replicas.replicas():
+                    replicas.copy_sqlite(alias)
+            if once:
+                break
+            time.sleep(interval)
+
+        for alias, lag in replicas.pool.status().items():
+            self.stdout.write(f'{alias}: ' + ('недоступна' if lag is None else f'отставание {lag:.1f} с'))
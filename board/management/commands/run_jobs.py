@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from board.jobs import claim, requeue_stale, run_job
+
+
+def _run(job_id):
+    try:
+        return run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди (обработка изображений, рассылка в ленты)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=getattr(settings, 'JOBS_WORKER_PROCESSES', 2),
+            help='Размер пула процессов; 0 — выполнять задачи в текущем процессе',
+        )
+        parser.add_argument('--batch', type=int, default=20, help='Сколько задач забирать за раз')
+        parser.add_argument('--poll', type=float, default=1.0, help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--stale-after', type=int, default=600, help='Через сколько секунд зависшая задача возвращается в очередь')
+        parser.add_argument('--once', action='store_true', help='Выполнить доступные задачи и выйти')
+
+    def handle(self, *args, processes, batch, poll, stale_after, once, **options):
+        pool = ProcessPoolExecutor(max_workers=processes) if processes else None
+        try:
+            while True:
+                requeue_stale(timedelta(seconds=stale_after))
+                job_ids = claim(batch)
+                if job_ids:
+                    if pool:
+                        # Forked workers must not inherit the parent's database connections.
+                        connections.close_all()
+                    statuses = pool.map(_run, job_ids) if pool else map(run_job, job_ids)
+                    for job_id, status in zip(job_ids, statuses):
+                        self.stdout.write(f'Задача {job_id}: {status}')
+                elif once:
+                    break
+                else:
+                    time.sleep(poll)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.shutdown()
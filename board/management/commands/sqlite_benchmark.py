@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from board import benchmarks, concurrency
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность чтений и записей (лайки, комментарии) из нескольких потоков '
+        'на SQLite со стандартными настройками Django и с настройками проекта'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300, help='Пользователей в тестовых данных')
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=4, help='Потоков записи')
+        parser.add_argument('--seconds', type=float, default=10, help='Длительность каждого прогона')
+
+    def handle(self, *args, users, readers, writers, seconds, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Бенчмарк рассчитан на SQLite')
+
+        modes = [('stock', concurrency.STOCK), ('tuned', concurrency.configured())]
+        with benchmarks.environment():
+            results = concurrency.compare(modes, users=users, readers=readers, writers=writers, seconds=seconds)
+        self.stdout.write(concurrency.report(results))
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('board', 'User')
+    Post = apps.get_model('board', 'Post')
+    Comment = apps.get_model('board', 'Comment')
+    Follow = apps.get_model('board', 'Follow')
+
+    def count(model, fk):
+        qs = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(total=Count('*')).values('total')
+        return Coalesce(Subquery(qs), 0)
+
+    Post.objects.update(
+        likes_count=count(Post.likes.through, 'post'),
+        comments_count=count(Comment, 'post'),
+    )
+    User.objects.update(
+        posts_count=count(Post, 'author'),
+        followers_count=count(Follow, 'following'),
+        following_count=count(Follow, 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0003_remove_topic_author_user_bio_user_gender_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
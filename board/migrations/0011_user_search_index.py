@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS board_user_fts "
+            "USING fts5(username, first_name, email, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            'INSERT INTO board_user_fts (rowid, username, first_name, email) '
+            'SELECT id, username, first_name, email FROM board_user'
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in ('username', 'first_name', 'email'):
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS board_user_{column}_trgm '
+                f'ON board_user USING gin ({column} gin_trgm_ops)'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS board_user_fts')
+    elif connection.vendor == 'postgresql':
+        for column in ('username', 'first_name', 'email'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS board_user_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0010_upload_session'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
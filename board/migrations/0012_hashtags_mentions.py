@@ -0,0 +1,90 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS board_post_fts "
+            "USING fts5(description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS board_comment_fts "
+            "USING fts5(content, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO board_post_fts (rowid, description) "
+            "SELECT id, description FROM board_post WHERE description != ''"
+        )
+        schema_editor.execute(
+            'INSERT INTO board_comment_fts (rowid, content) SELECT id, content FROM board_comment'
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS board_post_description_fts ON board_post '
+            "USING gin (to_tsvector('simple'::regconfig, COALESCE(description, '')))"
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS board_comment_content_fts ON board_comment '
+            "USING gin (to_tsvector('simple'::regconfig, COALESCE(content, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS board_post_fts')
+        schema_editor.execute('DROP TABLE IF EXISTS board_comment_fts')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS board_post_description_fts')
+        schema_editor.execute('DROP INDEX IF EXISTS board_comment_content_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0011_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('posts_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='board.comment')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='board.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='board_mention_recent')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostHashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='board.hashtag')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hashtag_links', to='board.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hashtag', '-created_at', '-post'], name='board_hashtag_recent')],
+                'unique_together': {('post', 'hashtag')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
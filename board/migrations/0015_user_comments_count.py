@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comments_count(apps, schema_editor):
+    User = apps.get_model('board', 'User')
+    Comment = apps.get_model('board', 'Comment')
+    counts = Comment.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(total=Count('*')).values('total')
+    User.objects.update(comments_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0014_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
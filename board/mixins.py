@@ -1,5 +1,12 @@
+import asyncio
 from urllib.parse import urlparse
 
+from django.contrib.auth.mixins import AccessMixin
+from django.http import JsonResponse
+
+from .pagination import CursorPaginator
+
+
 class RedirectBackMixin:
     redirect_field_name = 'next'
 
@@ -13,3 +20,77 @@ class RedirectBackMixin:
 
     def get_success_url(self):
         return self.get_redirect_url() or super().get_success_url()
+
+
+class CursorPaginationMixin:
+    cursor_kwarg = 'cursor'
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_approximate_total(self):
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(
+            queryset, page_size,
+            ordering=self.cursor_ordering,
+            approximate_total=self.get_approximate_total(),
+        )
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class AsyncUserMixin(AccessMixin):
+    # For views with async handlers: the lazy request.user from
+    # AuthenticationMiddleware would query synchronously on first access, so
+    # it is resolved with auser() before the handler runs.
+    login_required = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if self.login_required and not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncCursorListMixin(CursorPaginationMixin):
+    # ListView + CursorPaginationMixin for async views (with
+    # TemplateResponseMixin and ContextMixin): the page comes from the async
+    # ORM and get_extra_context() is awaited alongside it.
+    paginate_by = None
+    context_object_name = 'object_list'
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def get_extra_context(self):
+        return {}
+
+    async def get(self, request, *args, **kwargs):
+        paginator = CursorPaginator(
+            await self.aget_queryset(), self.paginate_by,
+            ordering=self.cursor_ordering,
+            approximate_total=self.get_approximate_total(),
+        )
+        page, extra = await asyncio.gather(
+            paginator.aget_page(request.GET.get(self.cursor_kwarg)), self.get_extra_context(),
+        )
+        context = self.get_context_data(
+            paginator=paginator, page_obj=page, is_paginated=page.has_other_pages(),
+            object_list=page.object_list, **{self.context_object_name: page.object_list}, **extra,
+        )
+        return self.render_to_response(context)
+
+
+class CursorJsonMixin:
+    # A function of one object returning its JSON-ready dict; views set it
+    # with staticmethod() so it is not bound as a method.
+    serializer = None
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        return JsonResponse({
+            'results': [self.serializer(obj) for obj in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+            'approximate_total': page.approximate_total,
+        }, **response_kwargs)
@@ -1,5 +1,11 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+
+from .storage import media_storage
+from django.db.models import Exists, OuterRef, Value, BooleanField
 
 
 def user_avatar_path(instance, filename):
@@ -11,7 +17,7 @@ def post_image_path(instance, filename):
 
 
 class User(AbstractUser):
-    avatar = models.ImageField(upload_to=user_avatar_path, blank=True, null=True)
+    avatar = models.ImageField(upload_to=user_avatar_path, storage=media_storage, blank=True, null=True)
     bio = models.TextField(blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
     gender = models.CharField(max_length=10, choices=[
@@ -19,15 +25,25 @@ class User(AbstractUser):
         ('female', 'Женский'),
         ('other', 'Другое'),
     ], blank=True)
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Popular users, the suggestions fallback.
+            models.Index(fields=['-followers_count', 'username'], name='board_user_popular'),
+            # Login by email (board/auth.py).
+            models.Index(fields=['email'], name='board_user_email'),
+        ]
 
     def post_count(self):
-        return self.posts.count()
+        return self.posts_count
 
     def follower_count(self):
-        return self.followers.count()
-
-    def following_count(self):
-        return self.following.count()
+        return self.followers_count
 
     def liked_posts_count(self):
         return self.liked_posts.count()
@@ -46,43 +62,237 @@ class User(AbstractUser):
 
 class Follow(models.Model):
     follower = models.ForeignKey(User, related_name='following', on_delete=models.CASCADE)
-    following = models.ForeignKey(User, related_name='followers', on_delete=models.CASCADE)
+    # Indexed below together with follower.
+    following = models.ForeignKey(User, related_name='followers', on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('follower', 'following')
+        indexes = [
+            # Covers follower lists and fan-out without reading the table.
+            models.Index(fields=['following', 'follower'], name='board_follow_followers'),
+        ]
 
     def __str__(self):
         return f'{self.follower} → {self.following}'
 
 
+class PostQuerySet(models.QuerySet):
+    def with_viewer_state(self, user):
+        if not user.is_authenticated:
+            return self.annotate(viewer_has_liked=Value(False, output_field=BooleanField()))
+        liked = Post.likes.through.objects.filter(post=OuterRef('pk'), user=user.pk)
+        return self.annotate(viewer_has_liked=Exists(liked))
+
+    def for_grid(self, user):
+        return self.select_related('author').with_viewer_state(user)
+
+
 class Post(models.Model):
-    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
-    image = models.ImageField(upload_to=post_image_path)
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', db_index=False)
+    image = models.ImageField(upload_to=post_image_path, storage=media_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    image_status = models.CharField(max_length=10, default=IMAGE_READY, editable=False, choices=[
+        (IMAGE_PROCESSING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готово'),
+        (IMAGE_FAILED, 'Ошибка'),
+    ])
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='board_post_recent'),
+            models.Index(fields=['author', '-created_at', '-id'], name='board_post_author_recent'),
+        ]
 
     def like_count(self):
-        return self.likes.count()
+        return self.likes_count
 
     def comment_count(self):
-        return self.comments.count()
-
-    def is_liked_by(self, user):
-        if user.is_authenticated:
-            return self.likes.filter(pk=user.pk).exists()
-        return False
+        return self.comments_count
 
     def __str__(self):
         return f'Пост от {self.author.username} ({self.created_at.strftime("%d.%m.%Y")})'
 
 
 class Comment(models.Model):
-    post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
-    author = models.ForeignKey(User, related_name='comments', on_delete=models.CASCADE)
+    # Both foreign keys lead the composite indexes below.
+    post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE, db_index=False)
+    author = models.ForeignKey(User, related_name='comments', on_delete=models.CASCADE, db_index=False)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='board_comment_thread'),
+            models.Index(fields=['author', '-created_at', '-id'], name='board_comment_author_recent'),
+        ]
+
     def __str__(self):
         return f'Комментарий от {self.author.username} к посту {self.post.id}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='timeline_entries', on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='board_timeline_user_recent'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} ← пост {self.post_id}'
+
+
+class Hashtag(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostHashtag(models.Model):
+    # created_at is copied from the post so hashtag pages can be paginated
+    # from this table's index without sorting the joined posts.
+    post = models.ForeignKey(Post, related_name='hashtag_links', on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, related_name='post_links', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('post', 'hashtag')
+        indexes = [
+            models.Index(fields=['hashtag', '-created_at', '-post'], name='board_hashtag_recent'),
+        ]
+
+    def __str__(self):
+        return f'#{self.hashtag.name} → пост {self.post_id}'
+
+
+class Mention(models.Model):
+    # comment is empty for mentions in the post description.
+    user = models.ForeignKey(User, related_name='mentions', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='mentions', on_delete=models.CASCADE)
+    comment = models.ForeignKey(Comment, related_name='mentions', null=True, blank=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='board_mention_recent'),
+        ]
+
+    def __str__(self):
+        return f'@{self.user.username} в посте {self.post_id}'
+
+
+class Suggestion(models.Model):
+    # Written by board.suggestions; never edited by hand.
+    user = models.ForeignKey(User, related_name='suggestions', on_delete=models.CASCADE)
+    suggested = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    mutual_follows = models.PositiveIntegerField(default=0)
+    mutual_likes = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [
+            models.Index(fields=['user', '-score'], name='board_suggestion_top'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} → {self.suggested} ({self.score:.1f})'
+
+
+class SuggestionRefresh(models.Model):
+    # Users whose follows or likes changed since their suggestions were computed.
+    user = models.OneToOneField(User, primary_key=True, related_name='+', on_delete=models.CASCADE)
+    requested_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.user} ({self.requested_at:%d.%m.%Y %H:%M})'
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, default=QUEUED, choices=[
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    ])
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='board_job_ready'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+
+class ReplicaHeartbeat(models.Model):
+    # One row, rewritten on the primary every second or so; its age on a
+    # replica is that replica's lag (board.replicas).
+    beat_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.beat_at:%H:%M:%S}'
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ×{self.refcount}'
+
+
+class UploadSession(models.Model):
+    OPEN = 'open'
+    COMPLETE = 'complete'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, related_name='upload_sessions', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    content_type = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=10, default=OPEN, choices=[
+        (OPEN, 'Загружается'),
+        (COMPLETE, 'Завершена'),
+    ])
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.size})'
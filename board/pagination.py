@@ -0,0 +1,199 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = [direction] + [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, *values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in ('n', 'p') or len(values) != size:
+        raise InvalidCursor(token)
+
+    decoded = []
+    for value in values:
+        if isinstance(value, str):
+            value = parse_datetime(value)
+            if value is None:
+                raise InvalidCursor(token)
+        elif not isinstance(value, int):
+            raise InvalidCursor(token)
+        decoded.append(value)
+    return direction, decoded
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.paginator.key(self.object_list[-1]), 'n')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(self.paginator.key(self.object_list[0]), 'p')
+
+    @property
+    def approximate_total(self):
+        return self.paginator.approximate_total
+
+
+# Keyset paginator: pages are fetched with a WHERE on the ordering keys of the
+# last row seen instead of OFFSET, so deep pages cost the same as the first.
+# Ordering keys must be fields or annotations of the queryset and the last one
+# must be unique.
+class CursorPaginator:
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), approximate_total=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.approximate_total = approximate_total
+
+    def key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _after(self, values, reverse):
+        # (a, b) > (x, y) expanded to a > x OR (a = x AND b > y), per key direction.
+        condition = Q()
+        equal = {}
+        for order, field, value in zip(self.ordering, self.fields, values):
+            descending = order.startswith('-') != reverse
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[field] = value
+        return condition
+
+    def _query(self, cursor):
+        # The rows to fetch for a cursor, and the direction they are read in.
+        if not cursor:
+            return None, self.queryset.order_by(*self.ordering)[:self.per_page + 1]
+
+        direction, values = decode_cursor(cursor, len(self.fields))
+        if direction == 'n':
+            qs = self.queryset.filter(self._after(values, reverse=False)).order_by(*self.ordering)
+            return direction, qs[:self.per_page + 1]
+
+        reversed_ordering = [o[1:] if o.startswith('-') else f'-{o}' for o in self.ordering]
+        qs = self.queryset.filter(self._after(values, reverse=True)).order_by(*reversed_ordering)
+        return direction, qs[:self.per_page + 1]
+
+    def _page(self, direction, rows):
+        if direction is None:
+            return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+        if direction == 'n':
+            return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, True, has_previous)
+
+    def page(self, cursor=None):
+        direction, qs = self._query(cursor)
+        return self._page(direction, list(qs))
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    async def apage(self, cursor=None):
+        direction, qs = self._query(cursor)
+        return self._page(direction, [obj async for obj in qs])
+
+    async def aget_page(self, cursor=None):
+        try:
+            return await self.apage(cursor)
+        except InvalidCursor:
+            return await self.apage()
+
+
+class RankedPage(CursorPage):
+    def __init__(self, object_list, paginator, offset, has_next):
+        super().__init__(object_list, paginator, has_next, offset > 0)
+        self.offset = offset
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor([self.offset + len(self.object_list)], 'n')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor([max(self.offset - self.paginator.per_page, 0)], 'n')
+
+
+# Relevance order has no stable key to seek on, so ranked results are paged by
+# offset behind the same opaque tokens. fetch(offset, limit) returns a list.
+class RankedPaginator:
+    max_offset = 1000
+
+    def __init__(self, fetch, per_page):
+        self.fetch = fetch
+        self.per_page = int(per_page)
+        self.approximate_total = None
+
+    def page(self, cursor=None):
+        offset = 0
+        if cursor:
+            _, (offset,) = decode_cursor(cursor, 1)
+            if not 0 <= offset <= self.max_offset:
+                raise InvalidCursor(cursor)
+        rows = self.fetch(offset, self.per_page + 1)
+        return RankedPage(rows[:self.per_page], self, offset, len(rows) > self.per_page)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
@@ -0,0 +1,32 @@
+from django.db import transaction
+
+from . import timeline
+from .caching import POST_LIST, invalidate, post_scope, user_scope
+from .counters import bump
+from .jobs import enqueue
+from .models import Post, User
+from .search.posts import index_comment, index_post
+
+
+def publish_post(post):
+    # Shared by PostCreateView and the chunked upload API.
+    post.image_status = Post.IMAGE_PROCESSING
+    with transaction.atomic():
+        post.save()
+        bump(User, post.author_id, posts_count=1)
+        index_post(post)
+        invalidate(POST_LIST, user_scope(post.author.username))
+        enqueue('process_post_image', post_id=post.pk)
+        timeline.schedule_fan_out(post)
+    return post
+
+
+def publish_comment(comment):
+    # comment.post and comment.author must be set.
+    with transaction.atomic():
+        comment.save()
+        bump(Post, comment.post_id, comments_count=1)
+        bump(User, comment.author_id, comments_count=1)
+        index_comment(comment)
+        invalidate(post_scope(comment.post_id), user_scope(comment.author.username))
+    return comment
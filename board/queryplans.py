@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test import Client
+
+from .benchmarks import SCENARIOS, fingerprint, quiet_requests
+
+EXPLAINED = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+# Statements whose flagged plan is expected, matched by a fragment of their
+# SQL, with the reason.
+ALLOWED = {
+    'board_user_fts MATCH': 'FTS matches are ranked after the lookup; the match itself bounds the sort',
+    'WHERE ("board_post"."author_id" IN (SELECT U0."following_id"': (
+        'Explore feed, followed part: each followed author is read through board_post_author_recent and the '
+        'sort keeps only the LIMIT newest'
+    ),
+}
+
+
+class Finding:
+    def __init__(self, scenario, sql, detail):
+        self.scenario = scenario
+        self.sql = sql
+        self.detail = detail
+
+
+class Recorder:
+    # execute_wrapper keeping statements with their parameters, which
+    # CaptureQueriesContext only has interpolated into the SQL.
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(EXPLAINED):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(plan):
+    # SQLite reports a table read without an index as "SCAN <table>" (with
+    # an index it is "SCAN t USING INDEX i", an ordered read the LIMIT
+    # stops early) and a sort it cannot get from an index as a temp B-tree.
+    for detail in plan:
+        if detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail:
+            yield detail
+        elif 'USE TEMP B-TREE' in detail:
+            yield detail
+
+
+def check(subjects, only=None):
+    # SQLite only: the plan wording above is SQLite's.
+    signed_in = Client()
+    signed_in.force_login(subjects.viewer)
+    anonymous = Client()
+    findings = []
+    seen = set()
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        recorder = Recorder()
+        # Not connection.execute_wrapper(): it pops the last wrapper on exit,
+        # which is the instrumentation one when the first request installs it.
+        connection.execute_wrappers.insert(0, recorder)
+        try:
+            with quiet_requests():
+                # Two requests, as some pages query differently on the second.
+                for iteration in range(2):
+                    scenario.request(anonymous if scenario.anonymous else signed_in, subjects, iteration)
+        finally:
+            connection.execute_wrappers.remove(recorder)
+        for sql, params in recorder.statements:
+            key = fingerprint(sql)
+            if (scenario.name, key) in seen or any(fragment in sql for fragment in ALLOWED):
+                continue
+            seen.add((scenario.name, key))
+            findings.extend(Finding(scenario.name, sql, detail) for detail in problems(explain(sql, params)))
+    return findings
+
+
+def report(findings):
+    lines = []
+    for finding in findings:
+        lines.append(f'{finding.scenario}: {finding.detail}')
+        lines.append(f'  {finding.sql[:300]}')
+    return '\n'.join(lines)
@@ -0,0 +1,189 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import suggestions, timeline
+from .caching import invalidate, post_scope, user_scope
+from .counters import bump
+from .graph import following_cache
+from .jobs import enqueue
+from .models import Follow, Post, User
+from .search import autocomplete
+
+logger = logging.getLogger(__name__)
+
+LIKES_TABLE = Post.likes.through._meta.db_table
+FOLLOWS_TABLE = Follow._meta.db_table
+STATEMENT_ROWS = 500
+
+
+def _insert(table, columns, rows, returning):
+    # One INSERT ... ON CONFLICT DO NOTHING per batch; RETURNING reports which
+    # rows were actually new, so counters move only for real changes.
+    inserted = []
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    for start in range(0, len(rows), STATEMENT_ROWS):
+        batch = rows[start:start + STATEMENT_ROWS]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row_sql] * len(batch))} '
+                f'ON CONFLICT DO NOTHING RETURNING {", ".join(returning)}',
+                [value for row in batch for value in row],
+            )
+            inserted += cursor.fetchall()
+    return inserted
+
+
+def _delete(table, columns, rows):
+    deleted = []
+    row_sql = '(' + ' AND '.join(f'{column} = %s' for column in columns) + ')'
+    for start in range(0, len(rows), STATEMENT_ROWS):
+        batch = rows[start:start + STATEMENT_ROWS]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {" OR ".join([row_sql] * len(batch))} '
+                f'RETURNING {", ".join(columns)}',
+                [value for row in batch for value in row],
+            )
+            deleted += cursor.fetchall()
+    return deleted
+
+
+def apply_likes(changes):
+    # changes: {(user_id, post_id): liked}. Returns the pairs that changed.
+    added = [(post_id, user_id) for (user_id, post_id), liked in changes.items() if liked]
+    removed = [(post_id, user_id) for (user_id, post_id), liked in changes.items() if not liked]
+    with transaction.atomic():
+        inserted = _insert(LIKES_TABLE, ('post_id', 'user_id'), added, ('post_id', 'user_id'))
+        deleted = _delete(LIKES_TABLE, ('post_id', 'user_id'), removed)
+
+        deltas = Counter(post_id for post_id, _ in inserted)
+        deltas.subtract(post_id for post_id, _ in deleted)
+        # One UPDATE per post however many users liked it in the batch.
+        for post_id, delta in deltas.items():
+            if delta:
+                bump(Post, post_id, likes_count=delta)
+
+        changed = {(user_id, post_id) for post_id, user_id in inserted + deleted}
+        if changed:
+            invalidate(*{post_scope(post_id) for _, post_id in changed})
+            suggestions.mark_stale(*{user_id for user_id, _ in changed})
+    return changed
+
+
+def apply_follows(changes):
+    # changes: {(follower_id, following_id): following}. Returns the pairs
+    # that changed.
+    # A raw INSERT skips the field's conversion, so adapt the value the way
+    # the ORM would for this backend.
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    added = [(follower, following, now) for (follower, following), state in changes.items() if state]
+    removed = [pair for pair, state in changes.items() if not state]
+    with transaction.atomic():
+        inserted = _insert(
+            FOLLOWS_TABLE, ('follower_id', 'following_id', 'created_at'), added, ('follower_id', 'following_id'),
+        )
+        deleted = _delete(FOLLOWS_TABLE, ('follower_id', 'following_id'), removed)
+        if not inserted and not deleted:
+            return set()
+
+        users = User.objects.in_bulk({pk for pair in inserted + deleted for pk in pair})
+        followers, following = Counter(), Counter()
+        for follower_id, following_id in inserted:
+            timeline.backfill(users[follower_id], users[following_id])
+            followers[following_id] += 1
+            following[follower_id] += 1
+        for follower_id, following_id in deleted:
+            timeline.prune(users[follower_id], users[following_id])
+            followers[following_id] -= 1
+            following[follower_id] -= 1
+
+        for user_id in followers.keys() | following.keys():
+            deltas = {'followers_count': followers[user_id], 'following_count': following[user_id]}
+            deltas = {field: delta for field, delta in deltas.items() if delta}
+            if deltas:
+                bump(User, user_id, **deltas)
+        invalidate(*(user_scope(user.username) for user in users.values()))
+        suggestions.mark_stale(*following)
+        applied = {pair: True for pair in inserted} | {pair: False for pair in deleted}
+        transaction.on_commit(lambda: autocomplete.follows_changed(applied))
+
+    for follower_id in following:
+        following_cache.discard(follower_id)
+    return set(inserted) | set(deleted)
+
+
+class WriteBehindBuffer:
+    # Collects desired states per key for `window` seconds and applies the
+    # last one for each key in a single batch, so a double-tap is one write
+    # (or none) and a burst of likes on one post is one counter update.
+    # Pending changes live in this process only; a failed batch is handed to
+    # the job queue instead of being dropped.
+
+    def __init__(self, apply, job_kind, window):
+        self.apply = apply
+        self.job_kind = job_kind
+        self.window = window
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def put(self, key, state):
+        if not self.window:
+            return self.apply({key: state})
+        with self._lock:
+            self._pending[key] = state
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    async def aput(self, key, state):
+        if not self.window:
+            return await sync_to_async(self.apply)({key: state})
+        return self.put(key, state)
+
+    def pending(self, key):
+        with self._lock:
+            return self._pending.get(key)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return set()
+        try:
+            return self.apply(pending)
+        except Exception:
+            logger.exception('Applying %s buffered %s changes failed, queued for retry', len(pending), self.job_kind)
+            enqueue(self.job_kind, changes=[[*key, state] for key, state in pending.items()])
+            return set()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+def window():
+    return getattr(settings, 'RELATIONS_WRITE_BEHIND_WINDOW', 0.2)
+
+
+like_buffer = WriteBehindBuffer(apply_likes, 'apply_likes', window())
+follow_buffer = WriteBehindBuffer(apply_follows, 'apply_follows', window())
+
+
+@atexit.register
+def flush_buffers():
+    like_buffer.flush()
+    follow_buffer.flush()
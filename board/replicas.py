@@ -0,0 +1,191 @@
+import random
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+PRIMARY = 'default'
+PIN_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Always read from the primary. A session missing on a lagging replica makes
+# SessionMiddleware delete the visitor's cookie, logging them out for good.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# True while reads must go to the primary. Only ReplicaPinningMiddleware
+# clears it, for safe requests, so management commands, jobs and tests read
+# what they wrote.
+_pinned = ContextVar('board_replica_pinned', default=True)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def max_lag():
+    return getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 2)
+
+
+def check_interval():
+    return getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 1)
+
+
+def sticky_seconds():
+    # Never shorter than the lag a replica in use may have, or the user's
+    # next read could still miss the write.
+    return max(getattr(settings, 'REPLICA_STICKY_SECONDS', 5), max_lag() + check_interval())
+
+
+def stale_window():
+    # How long after a commit a replica read may still return the old rows.
+    return max_lag() + check_interval() if replicas() else 0
+
+
+def beat():
+    # Replicas are as far behind as the heartbeat row they have; someone has
+    # to keep writing it (manage.py replica_heartbeat).
+    from .models import ReplicaHeartbeat
+
+    ReplicaHeartbeat.objects.using(PRIMARY).update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+
+
+def measure_lag(alias):
+    from .models import ReplicaHeartbeat
+
+    try:
+        beat_at = ReplicaHeartbeat.objects.using(alias).values_list('beat_at', flat=True).filter(pk=1).first()
+    except DatabaseError:
+        return None
+    if beat_at is None:
+        return None
+    return (timezone.now() - beat_at).total_seconds()
+
+
+class ReplicaPool:
+    # Per-process view of replica lag, re-measured at most every
+    # check_interval() seconds per replica. A replica that is too far behind,
+    # has no heartbeat or fails the check gets no reads until it catches up.
+
+    def __init__(self, measure=measure_lag):
+        self.measure = measure
+        self._lock = threading.Lock()
+        self._lags = {}
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._lags.get(alias)
+            if checked is not None and now - checked[0] < check_interval():
+                return checked[1]
+            # Claimed before measuring so concurrent readers don't all check.
+            self._lags[alias] = (now, checked[1] if checked else None)
+        lag = self.measure(alias)
+        with self._lock:
+            self._lags[alias] = (now, lag)
+        return lag
+
+    def healthy(self):
+        return [alias for alias in replicas() if (lag := self.lag(alias)) is not None and lag <= max_lag()]
+
+    def status(self):
+        return {alias: self.lag(alias) for alias in replicas()}
+
+    def clear(self):
+        with self._lock:
+            self._lags.clear()
+
+
+pool = ReplicaPool()
+
+
+class ReplicaRouter:
+    # Writes go to the primary. Reads go to a random healthy replica unless the
+    # request is pinned: a write earlier in the same request, an unsafe method,
+    # or the user's own write within sticky_seconds() (read-your-writes).
+
+    def db_for_read(self, model, **hints):
+        if not replicas():
+            return None
+        if _pinned.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        healthy = pool.healthy()
+        return random.choice(healthy) if healthy else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if replicas():
+            _pinned.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in replicas() else None
+
+
+class ReplicaPinningMiddleware:
+    # Unpins safe requests so their reads may use replicas, and after an
+    # unsafe one sets a short-lived cookie that keeps the user's reads on the
+    # primary until the replicas have their write.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _pin(self, request):
+        if request.method not in SAFE_METHODS:
+            return True
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _finish(self, request, response):
+        if request.method not in SAFE_METHODS and replicas():
+            seconds = sticky_seconds()
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + seconds:.0f}', max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _pinned.set(self._pin(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = _pinned.set(self._pin(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(request, response)
+
+
+def copy_sqlite(alias):
+    # Local stand-in for replication: copies the primary SQLite file into the
+    # replica's with the online backup API, so readers keep working.
+    source = sqlite3.connect(settings.DATABASES[PRIMARY]['NAME'])
+    target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_USER_BACKEND = 'board.search.users.SQLiteUserSearch'
+DEFAULT_POST_BACKEND = 'board.search.posts.SQLitePostSearch'
+
+
+def get_user_search():
+    return import_string(getattr(settings, 'USER_SEARCH_BACKEND', DEFAULT_USER_BACKEND))()
+
+
+def get_post_search():
+    return import_string(getattr(settings, 'POST_SEARCH_BACKEND', DEFAULT_POST_BACKEND))()
@@ -0,0 +1,198 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from board.models import Follow
+
+User = get_user_model()
+
+CANDIDATE_LIMIT = 200
+# Sorts after any character a key can continue with.
+LAST_CHARACTER = chr(0x10FFFF)
+
+
+def _keys(username, first_name):
+    keys = {username.lower()}
+    keys.update(word.lower() for word in first_name.split())
+    return keys
+
+
+def _avatar_url(user):
+    if not user.avatar:
+        return None
+    variants = (user.avatar_variants or {}).get('webp', {})
+    if variants:
+        smallest = min(variants, key=int)
+        return user.avatar.storage.url(variants[smallest])
+    return user.avatar.url
+
+
+class PrefixIndex:
+    # Sorted array of (key, user_id) searched with bisect. Keys are the
+    # lowercased username and each word of the first name. Also holds who
+    # follows whom, for the boost, so a search never goes to the database.
+    # Writers replace _keys with a new list instead of changing it, so a
+    # search works on a consistent snapshot without holding the lock.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._entries = {}
+        self._following = {}
+        self.built_at = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        users = User.objects.only('id', 'username', 'first_name', 'avatar', 'avatar_variants', 'followers_count')
+        keys = []
+        for user in users.iterator(chunk_size=5000):
+            index._entries[user.pk] = index._entry(user)
+            keys.extend((key, user.pk) for key in _keys(user.username, user.first_name))
+        keys.sort()
+        index._keys = keys
+        following = {}
+        pairs = Follow.objects.values_list('follower_id', 'following_id')
+        for follower_id, following_id in pairs.iterator(chunk_size=5000):
+            following.setdefault(follower_id, set()).add(following_id)
+        index._following = {follower_id: frozenset(ids) for follower_id, ids in following.items()}
+        index.built_at = time.monotonic()
+        return index
+
+    @staticmethod
+    def _entry(user):
+        return {
+            'id': user.pk,
+            'username': user.username,
+            'first_name': user.first_name,
+            'avatar': _avatar_url(user),
+            'followers_count': user.followers_count,
+        }
+
+    def add(self, user):
+        with self._lock:
+            keys = self._without(self._keys, self._entries.pop(user.pk, None))
+            self._entries[user.pk] = self._entry(user)
+            for key in _keys(user.username, user.first_name):
+                insort(keys, (key, user.pk))
+            self._keys = keys
+
+    def remove(self, user_id):
+        with self._lock:
+            self._keys = self._without(self._keys, self._entries.pop(user_id, None))
+            self._following.pop(user_id, None)
+
+    @staticmethod
+    def _without(keys, entry):
+        keys = list(keys)
+        if entry is None:
+            return keys
+        for key in _keys(entry['username'], entry['first_name']):
+            position = bisect_left(keys, (key, entry['id']))
+            if position < len(keys) and keys[position] == (key, entry['id']):
+                del keys[position]
+        return keys
+
+    def follow(self, follower_id, following_id, following):
+        with self._lock:
+            ids = self._following.get(follower_id, frozenset())
+            self._following[follower_id] = ids | {following_id} if following else ids - {following_id}
+
+    def following(self, user_id):
+        return self._following.get(user_id, frozenset())
+
+    def _matches(self, entry, prefix):
+        return any(key.startswith(prefix) for key in _keys(entry['username'], entry['first_name']))
+
+    def search(self, prefix, limit=8, viewer_id=None):
+        prefix = prefix.lower()
+        keys, entries = self._keys, self._entries
+        boost_ids = self.following(viewer_id)
+        position = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (prefix + LAST_CHARACTER,), position)
+
+        # Followed users rank first whatever their place in the prefix range,
+        # so they are collected from whichever side is smaller before the cap.
+        candidates = {}
+        if len(boost_ids) < end - position:
+            for user_id in boost_ids:
+                entry = entries.get(user_id)
+                if entry is not None and self._matches(entry, prefix):
+                    candidates[user_id] = entry
+        else:
+            for _, user_id in keys[position:end]:
+                if user_id in boost_ids and (entry := entries.get(user_id)) is not None:
+                    candidates[user_id] = entry
+        followed = len(candidates)
+
+        while position < end and len(candidates) < followed + CANDIDATE_LIMIT:
+            user_id = keys[position][1]
+            entry = entries.get(user_id)
+            if entry is not None:
+                candidates[user_id] = entry
+            position += 1
+
+        def rank(entry):
+            return (
+                entry['id'] not in boost_ids,
+                not entry['username'].lower().startswith(prefix),
+                -entry['followers_count'],
+                entry['username'],
+            )
+
+        ranked = sorted(candidates.values(), key=rank)[:limit]
+        return [dict(entry, followed=entry['id'] in boost_ids) for entry in ranked]
+
+
+_index = None
+_index_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def _refresh():
+    global _index
+    try:
+        _index = PrefixIndex.build()
+    finally:
+        connection.close()
+        _refreshing.clear()
+
+
+def get_index():
+    # Built when the server starts (forum/wsgi.py, forum/asgi.py), or on first
+    # use elsewhere; afterwards rebuilt in the background every
+    # AUTOCOMPLETE_REFRESH_SECONDS to pick up writes made by other processes.
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PrefixIndex.build()
+    ttl = getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 300)
+    if ttl and time.monotonic() - _index.built_at > ttl and not _refreshing.is_set():
+        _refreshing.set()
+        threading.Thread(target=_refresh, daemon=True).start()
+    return _index
+
+
+def index_user(user):
+    if _index is not None:
+        _index.add(user)
+
+
+def unindex_user(user_id):
+    if _index is not None:
+        _index.remove(user_id)
+
+
+def follows_changed(changes):
+    # changes: {(follower_id, following_id): following}, as applied.
+    if _index is not None:
+        for (follower_id, following_id), following in changes.items():
+            _index.follow(follower_id, following_id, following)
@@ -0,0 +1,228 @@
+import re
+from itertools import islice
+
+from django.db import connection, connections, router
+from django.db.models import F
+
+from board.counters import rebuild as rebuild_counter
+from board.models import Comment, Hashtag, Mention, Post, PostHashtag, User
+
+from . import get_post_search
+
+HASHTAG_RE = re.compile(r'(?<![\w&#])#(\w{1,100})')
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]{1,150})')
+WORD_RE = re.compile(r'\w+')
+
+POST_FTS_TABLE = 'board_post_fts'
+COMMENT_FTS_TABLE = 'board_comment_fts'
+
+
+def extract_hashtags(text):
+    return {name.lower() for name in HASHTAG_RE.findall(text or '')}
+
+
+def extract_mentions(text):
+    # A trailing dot is punctuation, not part of the username.
+    return {name.rstrip('.') for name in MENTION_RE.findall(text or '')} - {''}
+
+
+def link_hashtags(post, names):
+    if not names:
+        return
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = set(Hashtag.objects.filter(name__in=names).values_list('pk', flat=True))
+    tag_ids -= set(PostHashtag.objects.filter(post=post, hashtag_id__in=tag_ids).values_list('hashtag_id', flat=True))
+    if not tag_ids:
+        return
+    PostHashtag.objects.bulk_create(
+        [PostHashtag(post=post, hashtag_id=pk, created_at=post.created_at) for pk in tag_ids],
+        ignore_conflicts=True,
+    )
+    Hashtag.objects.filter(pk__in=tag_ids).update(posts_count=F('posts_count') + 1)
+
+
+def record_mentions(post, text, comment=None):
+    names = extract_mentions(text)
+    if not names:
+        return
+    created_at = comment.created_at if comment else post.created_at
+    Mention.objects.bulk_create([
+        Mention(user_id=user_id, post=post, comment=comment, created_at=created_at)
+        for user_id in User.objects.filter(username__in=names).values_list('pk', flat=True)
+    ])
+
+
+def index_post(post):
+    # Must run in the transaction that saved the post. Hashtags are only ever
+    # added here and counted down when a post is deleted (board/signals.py);
+    # rebuild_tags() recomputes them from scratch.
+    link_hashtags(post, extract_hashtags(post.description))
+    Mention.objects.filter(post=post, comment__isnull=True).delete()
+    record_mentions(post, post.description)
+    get_post_search().index_post(post)
+
+
+def index_comment(comment):
+    link_hashtags(comment.post, extract_hashtags(comment.content))
+    record_mentions(comment.post, comment.content, comment)
+    get_post_search().index_comment(comment)
+
+
+def _documents():
+    posts = Post.objects.order_by().values_list('pk', 'created_at', 'description')
+    for post_id, created_at, text in posts.iterator(chunk_size=2000):
+        yield post_id, created_at, None, created_at, text
+    comments = Comment.objects.order_by().values_list('post_id', 'post__created_at', 'pk', 'created_at', 'content')
+    yield from comments.iterator(chunk_size=2000)
+
+
+def _index_batch(documents):
+    links, mentions = {}, []
+    for post_id, post_created_at, comment_id, created_at, text in documents:
+        for name in extract_hashtags(text):
+            links[post_id, name] = post_created_at
+        mentions.extend((name, post_id, comment_id, created_at) for name in extract_mentions(text))
+
+    names = {name for _, name in links}
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'pk'))
+    PostHashtag.objects.bulk_create([
+        PostHashtag(post_id=post_id, hashtag_id=tag_ids[name], created_at=created_at)
+        for (post_id, name), created_at in links.items()
+    ], ignore_conflicts=True)
+
+    user_ids = dict(User.objects.filter(username__in={m[0] for m in mentions}).values_list('username', 'pk'))
+    Mention.objects.bulk_create([
+        Mention(user_id=user_ids[name], post_id=post_id, comment_id=comment_id, created_at=created_at)
+        for name, post_id, comment_id, created_at in mentions if name in user_ids
+    ])
+
+
+def rebuild_tags(batch_size=1000):
+    # Call inside a transaction.
+    PostHashtag.objects.all().delete()
+    Mention.objects.all().delete()
+    documents = _documents()
+    while batch := list(islice(documents, batch_size)):
+        _index_batch(batch)
+    rebuild_counter(Hashtag, 'posts_count', PostHashtag, 'hashtag')
+    Hashtag.objects.filter(posts_count=0).delete()
+    return Hashtag.objects.count()
+
+
+def match_expression(query):
+    # Every word must match; the last one as a prefix so results keep up
+    # with the user typing.
+    terms = ['"{}"'.format(term) for term in WORD_RE.findall(query.lower())]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class LikePostSearch:
+    # Portable fallback: icontains scans ordered by popularity.
+    def post_ids(self, query, offset, limit):
+        matches = Post.objects.filter(description__icontains=query).order_by('-likes_count', '-id')
+        return list(matches.values_list('pk', flat=True)[offset:offset + limit])
+
+    def comment_ids(self, query, offset, limit):
+        matches = Comment.objects.filter(content__icontains=query).order_by('-id')
+        return list(matches.values_list('pk', flat=True)[offset:offset + limit])
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_comment(self, comment_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLitePostSearch(LikePostSearch):
+    # FTS5 tables keyed by rowid = post / comment id, ranked by bm25.
+    def _ranked(self, table, query, offset, limit):
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        # A raw cursor is not routed, so pick the read database here.
+        with connections[router.db_for_read(Post)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s OFFSET %s',
+                [expression, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _replace(self, table, column, pk, text):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+            if text:
+                cursor.execute(f'INSERT INTO {table} (rowid, {column}) VALUES (%s, %s)', [pk, text])
+
+    def _delete(self, table, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+
+    def post_ids(self, query, offset, limit):
+        return self._ranked(POST_FTS_TABLE, query, offset, limit)
+
+    def comment_ids(self, query, offset, limit):
+        return self._ranked(COMMENT_FTS_TABLE, query, offset, limit)
+
+    def index_post(self, post):
+        self._replace(POST_FTS_TABLE, 'description', post.pk, post.description)
+
+    def remove_post(self, post_id):
+        self._delete(POST_FTS_TABLE, post_id)
+
+    def index_comment(self, comment):
+        self._replace(COMMENT_FTS_TABLE, 'content', comment.pk, comment.content)
+
+    def remove_comment(self, comment_id):
+        self._delete(COMMENT_FTS_TABLE, comment_id)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POST_FTS_TABLE}')
+            cursor.execute(f'DELETE FROM {COMMENT_FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {POST_FTS_TABLE} (rowid, description) '
+                f"SELECT id, description FROM {Post._meta.db_table} WHERE description != ''"
+            )
+            indexed = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {COMMENT_FTS_TABLE} (rowid, content) '
+                f'SELECT id, content FROM {Comment._meta.db_table}'
+            )
+            return indexed + cursor.rowcount
+
+
+class PostgresPostSearch(LikePostSearch):
+    # Served by the to_tsvector('simple', ...) GIN indexes created in the
+    # migration; the 'simple' config because content is mixed-language.
+    def _ranked(self, queryset, field, query, offset, limit):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector(field, config='simple')
+        search_query = SearchQuery(query, config='simple', search_type='websearch')
+        matches = (
+            queryset
+            .annotate(search=vector)
+            .filter(search=search_query)
+            .annotate(rank=SearchRank(vector, search_query))
+            .order_by('-rank', '-pk')
+        )
+        return list(matches.values_list('pk', flat=True)[offset:offset + limit])
+
+    def post_ids(self, query, offset, limit):
+        return self._ranked(Post.objects.all(), 'description', query, offset, limit)
+
+    def comment_ids(self, query, offset, limit):
+        return self._ranked(Comment.objects.all(), 'content', query, offset, limit)
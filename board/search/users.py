@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+User = get_user_model()
+
+INDEXED_FIELDS = ('username', 'first_name', 'email')
+FTS_TABLE = 'board_user_fts'
+MIN_TRIGRAM_LENGTH = 3
+
+
+def ranked(queryset, query):
+    # Prefix matches on the username first, then on the first name, then the
+    # rest; ties go to the more followed account.
+    prefix = Case(
+        When(username__istartswith=query, then=Value(0)),
+        When(first_name__istartswith=query, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    return queryset.annotate(search_rank=prefix).order_by('search_rank', '-followers_count', 'username')
+
+
+class LikeUserSearch:
+    # Portable fallback: the historical icontains scan, but ranked.
+    def search(self, query):
+        matches = User.objects.filter(
+            Q(username__icontains=query) |
+            Q(email__icontains=query) |
+            Q(first_name__icontains=query)
+        )
+        return ranked(matches, query)
+
+    def index(self, user):
+        pass
+
+    def remove(self, user_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteUserSearch(LikeUserSearch):
+    # FTS5 table with the trigram tokenizer: substring queries of three or
+    # more characters are answered from the index instead of a LIKE scan.
+    def search(self, query):
+        if len(query) < MIN_TRIGRAM_LENGTH:
+            # Too short for a trigram: prefixes of the indexed fields, which
+            # ranked() orders anyway.
+            prefix = Q()
+            for field in INDEXED_FIELDS:
+                prefix |= Q(**{f'{field}__istartswith': query})
+            return ranked(User.objects.filter(prefix), query)
+        phrase = '"{}"'.format(query.replace('"', '""'))
+        ids = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase])
+        return ranked(User.objects.filter(pk__in=ids), query)
+
+    def index(self, user):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [user.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, username, first_name, email) VALUES (%s, %s, %s, %s)',
+                [user.pk, user.username, user.first_name, user.email],
+            )
+
+    def remove(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [user_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, username, first_name, email) '
+                f'SELECT id, username, first_name, email FROM {User._meta.db_table}'
+            )
+            return cursor.rowcount
+
+
+class PostgresTrigramUserSearch(LikeUserSearch):
+    # ILIKE '%q%' is served by the gin_trgm_ops indexes created in the
+    # migration; similarity breaks ties within the same prefix rank.
+    def search(self, query):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return super().search(query).annotate(
+            similarity=TrigramWordSimilarity(query, 'username'),
+        ).order_by('search_rank', '-similarity', '-followers_count', 'username')
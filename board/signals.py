@@ -0,0 +1,126 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import POST_LIST, invalidate, post_scope, user_scope
+from .counters import bump
+from .graph import following_cache
+from .models import Comment, Follow, Hashtag, Post, User
+from .search import get_post_search, get_user_search, autocomplete
+from .search.users import INDEXED_FIELDS
+
+
+def release_file(field_file):
+    if field_file:
+        name, storage = field_file.name, field_file.storage
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    release_file(instance.image)
+
+
+@receiver(post_delete, sender=User)
+def release_avatar(sender, instance, **kwargs):
+    release_file(instance.avatar)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, raw=False, **kwargs):
+    if update_fields is not None and not set(update_fields) & {*INDEXED_FIELDS, 'avatar'}:
+        return
+    get_user_search().index(instance)
+    autocomplete.index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    get_user_search().remove(instance.pk)
+    autocomplete.unindex_user(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_post_search().remove_post(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    get_post_search().remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    # Covers ProfileUpdateView and admin edits; logins only touch last_login.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(user_scope(instance.username))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    invalidate(POST_LIST, post_scope(instance.pk))
+
+
+# Counters for deletes outside the view code paths: the admin and the cascades
+# of a deleted post or user. The collector runs these inside its transaction.
+# Likes and follows made through board.relations use raw SQL and send no
+# signals, so nothing here counts them twice.
+
+def invalidate_users(*pks):
+    invalidate(*(user_scope(username) for username in User.objects.filter(pk__in=pks).values_list('username', flat=True)))
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    bump(User, instance.author_id, posts_count=-1)
+    invalidate_users(instance.author_id)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    bump(Post, instance.post_id, comments_count=-1)
+    bump(User, instance.author_id, comments_count=-1)
+    invalidate(post_scope(instance.post_id))
+    invalidate_users(instance.author_id)
+
+
+@receiver(pre_delete, sender=Post)
+def uncount_hashtags(sender, instance, **kwargs):
+    # Also a fast delete, and rebuild_tags() empties PostHashtag wholesale, so
+    # the tags are counted down per post. A tag left without posts goes too.
+    tag_ids = list(instance.hashtag_links.values_list('hashtag_id', flat=True))
+    if tag_ids:
+        Hashtag.objects.filter(pk__in=tag_ids).update(posts_count=F('posts_count') - 1)
+        Hashtag.objects.filter(pk__in=tag_ids, posts_count=0).delete()
+
+
+@receiver(pre_delete, sender=User)
+def uncount_likes(sender, instance, **kwargs):
+    # The like rows go with the user in one fast delete that sends no signals,
+    # so the posts are counted down here while the rows still exist.
+    post_ids = list(Post.likes.through.objects.filter(user=instance).values_list('post_id', flat=True))
+    if post_ids:
+        Post.objects.filter(pk__in=post_ids).update(likes_count=F('likes_count') - 1)
+        invalidate(*(post_scope(post_id) for post_id in post_ids))
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created=False, raw=False, **kwargs):
+    # FollowAdmin; loaddata brings its own counters.
+    if created and not raw:
+        follow_counted(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    follow_counted(instance, -1)
+
+
+def follow_counted(follow, delta):
+    bump(User, follow.follower_id, following_count=delta)
+    bump(User, follow.following_id, followers_count=delta)
+    invalidate_users(follow.follower_id, follow.following_id)
+    transaction.on_commit(lambda: following_cache.discard(follow.follower_id))
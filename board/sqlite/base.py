@@ -0,0 +1,59 @@
+import threading
+from collections import defaultdict
+
+from django.db.backends.sqlite3 import base
+
+# One per database file: SQLite allows one writer per file, however many
+# processes and connections there are.
+_write_locks = defaultdict(threading.Lock)
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(name):
+    with _write_locks_guard:
+        return _write_locks[str(name)]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # The stock backend plus a per-process queue for write transactions.
+    # Writers waiting on SQLite's own busy handler poll with sleeps of up to
+    # 100 ms, so under contention one can lose the lock to newer arrivals for
+    # seconds; threads of one process instead block on a lock that wakes the
+    # next one as soon as the transaction ends. Other processes still meet
+    # at the busy handler. Only used with transaction_mode IMMEDIATE, where
+    # every transaction is a write transaction.
+    _holds_write_lock = False
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode == 'IMMEDIATE':
+            lock = write_lock(self.settings_dict['NAME'])
+            # Past the busy timeout, go on and let SQLite decide.
+            self._holds_write_lock = lock.acquire(timeout=self.settings_dict['OPTIONS'].get('timeout', 5))
+        try:
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            self._release_write_lock()
+            raise
+
+    def _release_write_lock(self):
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            write_lock(self.settings_dict['NAME']).release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._release_write_lock()
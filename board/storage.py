@@ -0,0 +1,109 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import F
+
+from .instrumentation import timed
+
+BLOB_PREFIX = 'cas'
+BLOB_RE = re.compile(r'^[0-9a-f]{64}(\.[^.]+)?$')
+
+
+def blob_name(digest, ext):
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+
+def is_blob(name):
+    return name.startswith(f'{BLOB_PREFIX}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Files are stored once under a name derived from the SHA-256 of their
+    # content; saving the same bytes again only increments MediaBlob.refcount
+    # and delete() only removes the file when the last reference goes away.
+    # Derivatives (see board.images) live next to the blob and share its
+    # lifetime.
+    content_addressed = True
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    @timed('storage')
+    def _save(self, name, content):
+        MediaBlob = apps.get_model('board', 'MediaBlob')
+
+        tmp_dir = self.path(f'{BLOB_PREFIX}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+
+            name = blob_name(digest.hexdigest(), os.path.splitext(name)[1])
+            with transaction.atomic():
+                blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={'size': size},
+                )
+                if not created:
+                    MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+                if created or not self.exists(name):
+                    os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+                    os.replace(tmp_path, self.path(name))
+                    if self.file_permissions_mode is not None:
+                        os.chmod(self.path(name), self.file_permissions_mode)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return name
+
+    @timed('storage')
+    def save_derivative(self, name, content):
+        # Derivatives are deterministic functions of the blob, so they are
+        # written under the exact name and never counted separately.
+        if self.exists(name):
+            os.remove(self.path(name))
+        return super()._save(name, content)
+
+    @timed('storage')
+    def _open(self, name, mode='rb'):
+        return super()._open(name, mode)
+
+    @timed('storage')
+    def delete(self, name):
+        if not name:
+            return
+        if not is_blob(name):
+            return super().delete(name)
+
+        MediaBlob = apps.get_model('board', 'MediaBlob')
+        directory, filename = os.path.split(name)
+        if not BLOB_RE.match(filename):
+            return  # a derivative; removed together with its blob
+        stem = filename.split('.', 1)[0]
+
+        with transaction.atomic():
+            updated = MediaBlob.objects.filter(name=name, refcount__gt=1).update(refcount=F('refcount') - 1)
+            if updated:
+                return
+            MediaBlob.objects.filter(name=name).delete()
+
+        super().delete(name)
+        for entry in self.listdir(directory)[1]:
+            if entry.startswith(f'{stem}.'):
+                super().delete(f'{directory}/{entry}')
+
+
+def media_storage():
+    return storages['media']
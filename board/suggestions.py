@@ -0,0 +1,211 @@
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Follow, Post, Suggestion, SuggestionRefresh, User
+
+
+def per_user():
+    return getattr(settings, 'SUGGESTIONS_PER_USER', 20)
+
+
+def like_weight():
+    return getattr(settings, 'SUGGESTIONS_LIKE_WEIGHT', 0.25)
+
+
+def like_fanout_limit():
+    # Posts liked by more users than this say little about any one of them.
+    return getattr(settings, 'SUGGESTIONS_LIKE_FANOUT_LIMIT', 1000)
+
+
+def mark_stale(*user_ids):
+    now = timezone.now()
+    SuggestionRefresh.objects.bulk_create(
+        [SuggestionRefresh(user_id=pk, requested_at=now) for pk in user_ids],
+        update_conflicts=True, unique_fields=['user'], update_fields=['requested_at'],
+    )
+
+
+def _read_pairs(sql, chunk_size=100_000):
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        while rows := cursor.fetchmany(chunk_size):
+            chunks.append(np.array(rows, dtype=np.int64))
+    if not chunks:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+class CSR:
+    # Compressed sparse rows: the neighbours of row r are
+    # indices[indptr[r]:indptr[r + 1]].
+
+    def __init__(self, src, dst, size):
+        order = np.argsort(src, kind='stable')
+        self.indices = dst[order]
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=size), out=self.indptr[1:])
+
+    def degree(self, rows):
+        return self.indptr[rows + 1] - self.indptr[rows]
+
+    def gather(self, rows):
+        # Neighbours of all rows concatenated, and for each the position in
+        # rows it came from.
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self.indices[starts[owner] + offsets], owner
+
+
+class Graph:
+    # Follow and like edges as CSR arrays over dense user indices.
+
+    def __init__(self, follows, likes):
+        self.user_ids = np.unique(np.concatenate([follows.ravel(), likes[:, 0]]))
+        size = len(self.user_ids)
+
+        follower = np.searchsorted(self.user_ids, follows[:, 0])
+        following = np.searchsorted(self.user_ids, follows[:, 1])
+        self.following = CSR(follower, following, size)
+        self.followers = CSR(following, follower, size)
+
+        post_ids, post_rows = np.unique(likes[:, 1], return_inverse=True)
+        liker = np.searchsorted(self.user_ids, likes[:, 0])
+        self.liked = CSR(liker, post_rows, size)
+        self.likers = CSR(post_rows, liker, len(post_ids))
+
+    @classmethod
+    def load(cls):
+        follows = _read_pairs(f'SELECT follower_id, following_id FROM {Follow._meta.db_table}')
+        likes = _read_pairs(f'SELECT user_id, post_id FROM {Post.likes.through._meta.db_table}')
+        return cls(follows, likes)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def rows(self, user_ids):
+        user_ids = np.unique(np.asarray(list(user_ids), dtype=np.int64))
+        positions = np.searchsorted(self.user_ids, user_ids)
+        inside = positions < len(self)
+        positions, user_ids = positions[inside], user_ids[inside]
+        return positions[self.user_ids[positions] == user_ids]
+
+    def suggest(self, rows, k, like_weight, fanout_limit):
+        # Counts two-hop paths for a block of users at once. Pairs are encoded
+        # as owner * len(self) + candidate so np.unique does the grouping.
+        size = len(self)
+
+        followed, owner = self.following.gather(rows)
+        existing = owner * size + followed
+        candidates, via = self.following.gather(followed)
+        follow_keys = owner[via] * size + candidates
+
+        posts, post_owner = self.liked.gather(rows)
+        keep = self.likers.degree(posts) <= fanout_limit
+        posts, post_owner = posts[keep], post_owner[keep]
+        colikers, via = self.likers.gather(posts)
+        like_keys = post_owner[via] * size + colikers
+
+        keys, inverse = np.unique(np.concatenate([follow_keys, like_keys]), return_inverse=True)
+        from_follow = np.arange(len(inverse)) < len(follow_keys)
+        mutual_follows = np.bincount(inverse, weights=from_follow, minlength=len(keys))
+        mutual_likes = np.bincount(inverse, weights=~from_follow, minlength=len(keys))
+
+        owner, candidate = np.divmod(keys, size)
+        valid = (candidate != rows[owner]) & ~np.isin(keys, existing)
+        owner, candidate = owner[valid], candidate[valid]
+        mutual_follows, mutual_likes = mutual_follows[valid], mutual_likes[valid]
+        score = mutual_follows + like_weight * mutual_likes
+
+        order = np.lexsort((candidate, -score, owner))
+        owner = owner[order]
+        group_start = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+        group_size = np.diff(np.r_[group_start, len(owner)])
+        rank = np.arange(len(owner)) - np.repeat(group_start, group_size)
+        top = order[rank < k]
+        return rows[owner[rank < k]], candidate[top], score[top], mutual_follows[top], mutual_likes[top]
+
+
+def _store(graph, rows, result, computed_at):
+    users, candidates, scores, mutual_follows, mutual_likes = result
+    user_ids = graph.user_ids[users].tolist()
+    suggested_ids = graph.user_ids[candidates].tolist()
+    with transaction.atomic():
+        Suggestion.objects.filter(user_id__in=graph.user_ids[rows].tolist()).delete()
+        Suggestion.objects.bulk_create([
+            Suggestion(
+                user_id=user_id, suggested_id=suggested_id, score=score,
+                mutual_follows=follows, mutual_likes=likes, computed_at=computed_at,
+            )
+            for user_id, suggested_id, score, follows, likes in zip(
+                user_ids, suggested_ids, scores.tolist(), mutual_follows.astype(int).tolist(),
+                mutual_likes.astype(int).tolist(),
+            )
+        ], batch_size=5000)
+    return len(user_ids)
+
+
+def refresh(user_ids=None, block_size=1000):
+    # Recomputes suggestions for user_ids (plus their followers, whose
+    # two-hop paths run through them) or, with None, for everyone.
+    started = timezone.now()
+    graph = Graph.load()
+    if user_ids is None:
+        rows = np.arange(len(graph))
+    else:
+        rows = graph.rows(user_ids)
+        rows = np.unique(np.concatenate([rows, graph.followers.gather(rows)[0]]))
+        missing = set(user_ids) - set(graph.user_ids[rows].tolist())
+        Suggestion.objects.filter(user_id__in=missing).delete()
+
+    written = 0
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        result = graph.suggest(block, per_user(), like_weight(), like_fanout_limit())
+        written += _store(graph, block, result, started)
+
+    if user_ids is None:
+        Suggestion.objects.filter(computed_at__lt=started).delete()
+        SuggestionRefresh.objects.filter(requested_at__lte=started).delete()
+    return len(rows), written
+
+
+def refresh_stale():
+    started = timezone.now()
+    user_ids = list(SuggestionRefresh.objects.filter(requested_at__lte=started).values_list('user_id', flat=True))
+    if not user_ids:
+        return 0, 0
+    result = refresh(user_ids)
+    SuggestionRefresh.objects.filter(user_id__in=user_ids, requested_at__lte=started).delete()
+    return result
+
+
+def for_user(user, graph, limit):
+    # Precomputed suggestions minus anyone followed since they were computed;
+    # the most followed accounts for users without any yet.
+    suggestions = list(
+        Suggestion.objects
+        .filter(user=user)
+        .select_related('suggested')
+        .order_by('-score')[:limit * 2]
+    )
+    graph.prefetch(s.suggested_id for s in suggestions)
+    users = []
+    for suggestion in suggestions:
+        if not graph.follows(suggestion.suggested_id):
+            suggested = suggestion.suggested
+            suggested.mutual_follows = suggestion.mutual_follows
+            suggested.mutual_likes = suggestion.mutual_likes
+            users.append(suggested)
+    if not users:
+        users = list(
+            User.objects
+            .exclude(pk=user.pk)
+            .exclude(pk__in=Follow.objects.filter(follower=user).values('following'))
+            .order_by('-followers_count', 'username')[:limit]
+        )
+    return users[:limit]
@@ -0,0 +1,47 @@
+from . import images, relations, timeline
+from .caching import invalidate, post_scope, user_scope
+from .jobs import handler
+from .models import Post, User
+
+
+def mark_post_image_failed(post_id):
+    Post.objects.filter(pk=post_id).update(image_status=Post.IMAGE_FAILED)
+    invalidate(post_scope(post_id))
+
+
+@handler('process_post_image', on_failure=mark_post_image_failed)
+def process_post_image(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    if images.strip_metadata(post.image):
+        Post.objects.filter(pk=post.pk).update(image=post.image.name)
+    images.process_post_image(post)
+    Post.objects.filter(pk=post.pk).update(image_status=Post.IMAGE_READY)
+    invalidate(post_scope(post.pk))
+
+
+@handler('process_avatar')
+def process_avatar(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    if user.avatar and images.strip_metadata(user.avatar):
+        User.objects.filter(pk=user.pk).update(avatar=user.avatar.name)
+    images.process_avatar(user)
+    invalidate(user_scope(user.username))
+
+
+@handler('fan_out_post')
+def fan_out_post(post_id):
+    timeline.fan_out_post(post_id)
+
+
+@handler('apply_likes')
+def apply_likes(changes):
+    relations.apply_likes({(user_id, post_id): liked for user_id, post_id, liked in changes})
+
+
+@handler('apply_follows')
+def apply_follows(changes):
+    relations.apply_follows({(follower_id, following_id): state for follower_id, following_id, state in changes})
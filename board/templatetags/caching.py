@@ -0,0 +1,39 @@
+from django import template
+
+from board.caching import cache_timeout, get_cache, make_key, record
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = make_key(name, 'fragment', *(var.resolve(context) for var in self.vary_on))
+        cache = get_cache()
+        content = cache.get(key)
+        record(name, hit=content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, cache_timeout())
+        return content
+
+
+@register.tag
+def versioned_cache(parser, token):
+    """
+    {% versioned_cache "name" version [more vary-on values] %}…{% endversioned_cache %}
+
+    Like {% cache %}, but in the VIEW_CACHE_ALIAS cache with hit/miss
+    metrics and no timeout argument; pass versions from board.caching.versions().
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f'{bits[0]} needs a name and at least one version')
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    return VersionedCacheNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,31 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from board.search.posts import HASHTAG_RE, MENTION_RE
+
+register = template.Library()
+
+
+def _hashtag_link(match):
+    name = match.group(1)
+    return format_html('<a href="{}">#{}</a>', reverse('board:hashtag', args=[name.lower()]), name)
+
+
+def _mention_link(match):
+    username = match.group(1).rstrip('.')
+    trailing = match.group(1)[len(username):]
+    if not username:
+        return match.group(0)
+    link = format_html('<a href="{}">@{}</a>', reverse('board:user_detail', args=[username]), username)
+    return link + trailing
+
+
+@register.filter(is_safe=True, needs_autoescape=True)
+def linkify_tags(text, autoescape=True):
+    # Escaped first; the patterns cannot match inside entities such as &#x27;.
+    text = conditional_escape(text) if autoescape else text
+    text = HASHTAG_RE.sub(_hashtag_link, text)
+    text = MENTION_RE.sub(_mention_link, text)
+    return mark_safe(text)
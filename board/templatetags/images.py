@@ -0,0 +1,27 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(field_file, variants, sizes='100vw', **attrs):
+    if not field_file:
+        return ''
+
+    storage = field_file.storage
+    sources = []
+    for fmt, names in (variants or {}).items():
+        srcset = ', '.join(
+            f'{storage.url(name)} {width}w'
+            for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+        )
+        sources.append((f'image/{fmt}', srcset, sizes))
+
+    return format_html(
+        '<picture>{}<img src="{}"{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', sources),
+        field_file.url,
+        flatatt(attrs),
+    )
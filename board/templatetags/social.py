@@ -0,0 +1,21 @@
+from django import template
+
+from board.graph import get_graph
+
+register = template.Library()
+
+
+@register.inclusion_tag('board/includes/follow_button.html', takes_context=True)
+def follow_button(context, target):
+    # Views prefetch the follow state of every user on the page, so this is
+    # answered from the request's SocialGraph memo.
+    request = context['request']
+    user = request.user
+    visible = user.is_authenticated and user.pk != target.pk
+    return {
+        'target': target,
+        'visible': visible,
+        'is_following': visible and get_graph(request).follows(target.pk),
+        'next': request.get_full_path(),
+        'csrf_token': context.get('csrf_token'),
+    }
@@ -0,0 +1,141 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+
+from .jobs import enqueue
+from .models import Follow, Post, TimelineEntry
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 10000)
+
+
+def backfill_size():
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 50)
+
+
+def batch_size():
+    return getattr(settings, 'TIMELINE_BATCH_SIZE', 1000)
+
+
+def is_fanned_out(author):
+    # Authors above the limit are merged into timelines on read instead.
+    return author.followers_count <= fanout_limit()
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for post_id, author_id, created_at in posts
+    ]
+
+
+def fan_out_post(post_id):
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not is_fanned_out(post.author):
+        return 0
+
+    follower_ids = (
+        Follow.objects
+        .filter(following=post.author_id)
+        .values_list('follower_id', flat=True)
+        .iterator(chunk_size=batch_size())
+    )
+    row = (post.pk, post.author_id, post.created_at)
+    pushed = 0
+    batch = []
+    for follower_id in follower_ids:
+        batch.extend(_entries(follower_id, [row]))
+        if len(batch) >= batch_size():
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            pushed += len(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        pushed += len(batch)
+    return pushed
+
+
+def schedule_fan_out(post):
+    return enqueue('fan_out_post', post_id=post.pk)
+
+
+def _latest_posts(author_id, since=None):
+    posts = Post.objects.filter(author=author_id)
+    if since is not None:
+        posts = posts.filter(created_at__gt=since)
+    return posts.order_by('-created_at', '-id').values_list('id', 'author_id', 'created_at')[:backfill_size()]
+
+
+def backfill(user, author):
+    if not is_fanned_out(author):
+        return 0
+    entries = _entries(user.pk, _latest_posts(author.pk))
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def prune(user, author):
+    return TimelineEntry.objects.filter(user=user, author=author).delete()[0]
+
+
+def pull_unfanned(user):
+    # Fan-out-on-read for authors with too many followers: copy their new
+    # posts into this user's timeline so the read stays a single range scan.
+    author_ids = list(
+        Follow.objects
+        .filter(follower=user, following__followers_count__gt=fanout_limit())
+        .values_list('following_id', flat=True)
+    )
+    if not author_ids:
+        return 0
+
+    last_seen = dict(
+        TimelineEntry.objects
+        .filter(user=user, author__in=author_ids)
+        .values('author')
+        .annotate(latest=Max('created_at'))
+        .values_list('author', 'latest')
+    )
+    # One query for all of them, each from where this timeline left off.
+    new_posts = Q(author__in=[author_id for author_id in author_ids if author_id not in last_seen])
+    for author_id, latest in last_seen.items():
+        new_posts |= Q(author=author_id, created_at__gt=latest)
+    rows = (
+        Post.objects.filter(new_posts)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'author_id', 'created_at')[:backfill_size() * len(author_ids)]
+    )
+    per_author = Counter()
+    posts = []
+    for row in rows:
+        per_author[row[1]] += 1
+        if per_author[row[1]] <= backfill_size():
+            posts.append(row)
+    if not posts:
+        # Nothing to write, so the request is not pinned to the primary.
+        return 0
+    TimelineEntry.objects.bulk_create(_entries(user.pk, posts), ignore_conflicts=True)
+    return len(posts)
+
+
+def home_timeline(user):
+    pull_unfanned(user)
+    return (
+        Post.objects
+        .for_grid(user)
+        .filter(timeline_entries__user=user)
+        .annotate(feed_created_at=F('timeline_entries__created_at'), feed_post_id=F('timeline_entries__post_id'))
+        .order_by('-feed_created_at', '-feed_post_id')
+    )
+
+
+def rebuild_timeline(user):
+    TimelineEntry.objects.filter(user=user).delete()
+    author_ids = Follow.objects.filter(follower=user, following__followers_count__lte=fanout_limit()).values_list('following_id', flat=True)
+    entries = []
+    for author_id in author_ids:
+        entries.extend(_entries(user.pk, _latest_posts(author_id)))
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
@@ -0,0 +1,130 @@
+import os
+import warnings
+
+from django.conf import settings
+from PIL import Image
+
+from .instrumentation import timed
+
+MAX_IMAGE_SIZE = getattr(settings, 'POST_IMAGE_MAX_SIZE', 20 * 1024 * 1024)
+MAX_CHUNK_SIZE = getattr(settings, 'UPLOAD_MAX_CHUNK_SIZE', 1024 * 1024)
+MAX_IMAGE_PIXELS = getattr(settings, 'POST_IMAGE_MAX_PIXELS', 40_000_000)
+READ_SIZE = 64 * 1024
+
+# Leading bytes of the formats we accept, checked as soon as they arrive.
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+def upload_root():
+    return getattr(settings, 'CHUNKED_UPLOAD_ROOT', settings.BASE_DIR / 'uploads_tmp')
+
+
+def session_path(session):
+    return os.path.join(upload_root(), f'{session.pk}.part')
+
+
+def validate_declaration(filename, size):
+    if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise UploadError('Неподдерживаемый тип файла')
+    if size <= 0:
+        raise UploadError('Пустой файл')
+    if size > MAX_IMAGE_SIZE:
+        raise UploadTooLarge('Файл слишком большой')
+
+
+def sniff_content_type(head):
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def check_header(path):
+    # Pillow only needs the first few KB to report format and dimensions,
+    # so decompression bombs are rejected long before the body is complete.
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns between its limit and twice that.
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(path) as image:
+                width, height = image.size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise UploadTooLarge('Слишком большое разрешение изображения')
+    except (OSError, SyntaxError):
+        return False
+    if width * height > MAX_IMAGE_PIXELS:
+        raise UploadError('Слишком большое разрешение изображения')
+    return True
+
+
+@timed('storage')
+def append_chunk(session, stream, offset, length):
+    if offset != session.received:
+        raise OffsetMismatch('Неверное смещение блока')
+    if length > MAX_CHUNK_SIZE:
+        raise UploadTooLarge('Блок слишком большой')
+    if session.received + length > session.size:
+        raise UploadTooLarge('Данных больше, чем заявлено')
+
+    os.makedirs(upload_root(), exist_ok=True)
+    path = session_path(session)
+    written = 0
+    with open(path, 'ab') as target:
+        target.truncate(session.received)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            target.write(data)
+            written += len(data)
+
+    session.received += written
+    try:
+        validate_partial(session, path)
+    except UploadError:
+        discard(session)
+        raise
+    return written
+
+
+@timed('storage')
+def validate_partial(session, path):
+    complete = session.received == session.size
+    if not session.content_type:
+        with open(path, 'rb') as part:
+            head = part.read(12)
+        if len(head) < 12 and not complete:
+            return
+        session.content_type = sniff_content_type(head) or ''
+        if not session.content_type:
+            raise UploadError('Файл не является изображением')
+    if complete or session.received >= READ_SIZE:
+        header_ok = check_header(path)
+        if complete and not header_ok:
+            raise UploadError('Файл не является изображением')
+
+
+def discard(session):
+    path = session_path(session)
+    if os.path.exists(path):
+        os.remove(path)
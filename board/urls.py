@@ -5,7 +5,11 @@ from django.views.generic import RedirectView
 from board.views import (
     RegisterView, CustomLoginView, CustomLogoutView,
     ProfileUpdateView, UserDetailView,
-    PostCreateView, PostDetailView, UserListView, PostListView, ToggleLikeView, ToggleFollowView, UserSearchView
+    PostCreateView, PostDetailView, UserListView, PostListView, ToggleLikeView, ToggleFollowView, UserSearchView,
+    HomeFeedView, PostListApiView, HomeFeedApiView, PostCommentListApiView, UserCommentListApiView, FeedView, FeedApiView,
+    ChunkedUploadView, UploadChunkView, UserAutocompleteView,
+    HashtagView, HashtagApiView, PostSearchView, PostSearchApiView, SuggestedUsersView,
+    LikeApiView, FollowApiView, PerformanceView,
 )
 
 
@@ -13,12 +17,19 @@ app_name = 'board'
 
 urlpatterns = [
     path('', PostListView.as_view(), name='post_list'),
+    path('feed/', HomeFeedView.as_view(), name='home_feed'),
+    path('explore/', FeedView.as_view(), name='feed'),
     path('users/', UserListView.as_view(), name='user_list'),
     path('users/search/', UserSearchView.as_view(), name='user_search'),
+    path('users/suggested/', SuggestedUsersView.as_view(), name='suggested_users'),
+    path('api/users/autocomplete/', UserAutocompleteView.as_view(), name='user_autocomplete'),
     path('users/<str:username>/', UserDetailView.as_view(), name='user_detail'),
     path('profile/edit/', ProfileUpdateView.as_view(), name='profile_edit'),
     path('posts/add/', PostCreateView.as_view(), name='post_create'),
     path('posts/<int:pk>/', PostDetailView.as_view(), name='post_detail'),
+    path('search/', PostSearchView.as_view(), name='search'),
+    path('tags/<str:name>/', HashtagView.as_view(), name='hashtag'),
+    path('staff/performance/', PerformanceView.as_view(), name='performance'),
 
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', CustomLoginView.as_view(), name='login'),
@@ -27,5 +38,17 @@ urlpatterns = [
     path('post/<int:pk>/like/', ToggleLikeView.as_view(), name='post_like_toggle'),
     path('user/<int:pk>/follow/', ToggleFollowView.as_view(), name='user_follow_toggle'),
 
+    path('api/posts/', PostListApiView.as_view(), name='api_post_list'),
+    path('api/feed/', HomeFeedApiView.as_view(), name='api_home_feed'),
+    path('api/explore/', FeedApiView.as_view(), name='api_feed'),
+    path('api/search/', PostSearchApiView.as_view(), name='api_search'),
+    path('api/tags/<str:name>/', HashtagApiView.as_view(), name='api_hashtag'),
+    path('api/posts/<int:pk>/like/', LikeApiView.as_view(), name='api_post_like'),
+    path('api/users/<int:pk>/follow/', FollowApiView.as_view(), name='api_user_follow'),
+    path('api/posts/<int:pk>/comments/', PostCommentListApiView.as_view(), name='api_post_comments'),
+    path('api/users/<str:username>/comments/', UserCommentListApiView.as_view(), name='api_user_comments'),
+    path('api/uploads/', ChunkedUploadView.as_view(), name='upload_create'),
+    path('api/uploads/<uuid:pk>/', UploadChunkView.as_view(), name='upload_chunk'),
+
     path('accounts/login/', RedirectView.as_view(pattern_name='login', permanent=False))
 ]
@@ -1,20 +1,37 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator
-from django.db.models import Q, IntegerField, Case, When
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.db.models import F
 from django.urls import reverse_lazy, reverse
 from django.shortcuts import redirect, get_object_or_404
-from django.http import JsonResponse
+from django.core.files import File
+from django.http import Http404, JsonResponse
 from django.contrib.auth.views import LoginView, LogoutView
-from django.views.generic import CreateView, ListView, DetailView, UpdateView, View
-from django.views.generic.edit import FormMixin
+from django.views.generic import CreateView, ListView, TemplateView, UpdateView, View
+from django.views.generic.base import ContextMixin, TemplateResponseMixin
 
 from .forms.register_form import RegisterForm
-from .models import Post, Comment, Follow
+from .forms.login_form import LoginForm
+from .models import Post, Comment, Hashtag, UploadSession
 from .forms.profile_update_form import ProfileUpdateForm
 from .forms.post_create_form import PostCreateForm
 from .forms.comment_form import CommentForm
-from .mixins import RedirectBackMixin
+from .mixins import RedirectBackMixin, CursorPaginationMixin, CursorJsonMixin, AsyncUserMixin, AsyncCursorListMixin
+from .pagination import CursorPaginator, RankedPaginator
+from .caching import AnonymousPageCacheMixin, POST_LIST, aversions, post_scope, user_scope
+from .caching import hit_counts as cache_hit_counts, stats as cache_stats
+from . import instrumentation
+from . import relations, replicas, timeline
+from .feed import MergedFeed
+from .graph import get_graph
+from . import suggestions
+from .jobs import enqueue
+from .signals import release_file
+from .publishing import publish_comment, publish_post
+from . import uploads
+from .search import get_user_search, get_post_search, autocomplete
 
 User = get_user_model()
 
@@ -26,49 +43,54 @@ class UserListView(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        query = self.request.GET.get('q')
+        query = self.request.GET.get('q', '').strip()
         if query:
-            return User.objects.filter(
-                Q(username__icontains=query) |
-                Q(email__icontains=query) |
-                Q(first_name__icontains=query)
-            ).distinct()
-        return User.objects.all()
-
-
-class UserDetailView(DetailView):
-    model = User
-    template_name = 'board/user_detail.html'
-    context_object_name = 'profile_user'
-    slug_field = 'username'
-    slug_url_kwarg = 'username'
-    paginate_by = 9
+            return get_user_search().search(query)
+        return User.objects.order_by('username')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        profile_user = self.get_object()
-
-        posts_qs = Post.objects.filter(author=profile_user).order_by('-created_at')
-        paginator = Paginator(posts_qs, self.paginate_by)
-        page_number = self.request.GET.get('page')
-        posts_page = paginator.get_page(page_number)
-
-        comments = Comment.objects.filter(author=profile_user).order_by('-created_at')
-
-        context['posts_paginator'] = posts_page
-        context['comments'] = comments
-        context['posts_count'] = posts_qs.count()
-        context['followers_count'] = profile_user.followers.count()
-        context['following_count'] = profile_user.following.count()
+        get_graph(self.request).prefetch(user.pk for user in context['users'])
+        return context
 
-        context['is_own_profile'] = self.request.user == profile_user
 
-        if self.request.user.is_authenticated and not context['is_own_profile']:
-            context['is_following'] = Follow.objects.filter(follower=self.request.user, following=profile_user).exists()
-        else:
-            context['is_following'] = False
+class UserDetailView(AsyncUserMixin, TemplateResponseMixin, ContextMixin, View):
+    template_name = 'board/user_detail.html'
+    paginate_by = 9
 
-        return context
+    async def get_user(self, username):
+        try:
+            return await User.objects.aget(username=username)
+        except User.DoesNotExist:
+            raise Http404
+
+    async def get(self, request, username, *args, **kwargs):
+        # Read before the user is loaded; see board.caching.invalidate().
+        header_version, = await aversions([user_scope(username)])
+
+        # The profile and the first page of its posts are independent queries.
+        paginator = CursorPaginator(
+            Post.objects.filter(author__username=username).for_grid(request.user), self.paginate_by,
+        )
+        profile_user, posts_page = await asyncio.gather(
+            self.get_user(username), paginator.aget_page(request.GET.get('cursor')),
+        )
+        paginator.approximate_total = profile_user.posts_count
+
+        is_own_profile = request.user == profile_user
+        is_following = not is_own_profile and await sync_to_async(get_graph(request).follows)(profile_user.pk)
+
+        return self.render_to_response(self.get_context_data(
+            object=profile_user,
+            profile_user=profile_user,
+            posts_paginator=posts_page,
+            posts_count=profile_user.posts_count,
+            followers_count=profile_user.followers_count,
+            following_count=profile_user.following_count,
+            header_version=header_version,
+            is_own_profile=is_own_profile,
+            is_following=is_following,
+        ))
 
 
 class RegisterView(RedirectBackMixin, CreateView):
@@ -82,6 +104,12 @@ class RegisterView(RedirectBackMixin, CreateView):
         context['next'] = next_url
         return context
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if self.object.avatar:
+            enqueue('process_avatar', user_id=self.object.pk)
+        return response
+
 
 class ProfileUpdateView(RedirectBackMixin, LoginRequiredMixin, UpdateView):
     model = User
@@ -91,22 +119,42 @@ class ProfileUpdateView(RedirectBackMixin, LoginRequiredMixin, UpdateView):
     def get_object(self):
         return self.request.user
 
+    def form_valid(self, form):
+        previous_avatar = form.initial.get('avatar')
+        response = super().form_valid(form)
+        if 'avatar' in form.changed_data:
+            release_file(previous_avatar)
+            enqueue('process_avatar', user_id=self.object.pk)
+        return response
+
     def get_success_url(self):
         return self.get_redirect_url() or reverse('board:user_detail', kwargs={'username': self.request.user.username})
 
 
-class PostListView(ListView):
-    model = Post
+class PostListView(
+    AsyncUserMixin, AnonymousPageCacheMixin, AsyncCursorListMixin, TemplateResponseMixin, ContextMixin, View,
+):
     template_name = 'board/post_list.html'
     context_object_name = 'posts'
     paginate_by = 12
+    cache_name = 'post_list'
 
     def get_queryset(self):
-        return Post.objects.select_related('author').order_by('-created_at')
+        return Post.objects.for_grid(self.request.user)
+
+    def get_cache_scopes(self):
+        return [POST_LIST]
+
+    def get_cache_dependencies(self, context):
+        scopes = []
+        for post in context['posts']:
+            scopes += [post_scope(post.pk), user_scope(post.author.username)]
+        return scopes
 
 
 class CustomLoginView(LoginView):
     template_name = 'board/login.html'
+    form_class = LoginForm
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -119,34 +167,38 @@ class CustomLogoutView(LogoutView):
     next_page = reverse_lazy('board:login')
 
 
-class HomeFeedView(LoginRequiredMixin, ListView):
-    model = Post
+class HomeFeedView(AsyncUserMixin, AsyncCursorListMixin, TemplateResponseMixin, ContextMixin, View):
+    login_required = True
     template_name = 'board/post_feed.html'
     context_object_name = 'posts'
     paginate_by = 10
+    cursor_ordering = ('-feed_created_at', '-feed_post_id')
+    suggestions_limit = 5
 
-    def get_queryset(self):
-        following = Follow.objects.filter(follower=self.request.user).values_list('following', flat=True)
-        return Post.objects.filter(author__in=following).order_by('-created_at')
+    async def aget_queryset(self):
+        # home_timeline() first merges in posts of unfanned authors (writes).
+        return await sync_to_async(timeline.home_timeline)(self.request.user)
 
+    async def get_extra_context(self):
+        if not self.suggestions_limit or self.request.GET.get(self.cursor_kwarg):
+            return {}
+        suggested_users = await sync_to_async(suggestions.for_user)(
+            self.request.user, get_graph(self.request), self.suggestions_limit,
+        )
+        return {'suggested_users': suggested_users}
 
-class FeedView(LoginRequiredMixin, ListView):
-    model = Post
+
+class FeedView(LoginRequiredMixin, TemplateResponseMixin, ContextMixin, View):
+    # MergedFeed pages itself (it is not a queryset), so this is not a ListView.
     template_name = 'board/feed.html'
-    context_object_name = 'posts'
     paginate_by = 12
 
-    def get_queryset(self):
-        user = self.request.user
-        following_users_ids = Follow.objects.filter(follower=user).values_list('following_id', flat=True)
-
-        return Post.objects.annotate(
-            is_following=Case(
-                When(author__in=following_users_ids, then=1),
-                default=0,
-                output_field=IntegerField()
-            )
-        ).order_by('-is_following', '-created_at')
+    def get(self, request, *args, **kwargs):
+        page = MergedFeed(request.user).page(request.GET.get('cursor'), self.paginate_by)
+        context = self.get_context_data(
+            page_obj=page, is_paginated=page.has_other_pages(), posts=page.object_list,
+        )
+        return self.render_to_response(context)
 
 
 class PostCreateView(RedirectBackMixin, LoginRequiredMixin, CreateView):
@@ -156,65 +208,253 @@ class PostCreateView(RedirectBackMixin, LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.author = self.request.user
-        return super().form_valid(form)
+        self.object = publish_post(form.save(commit=False))
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return self.get_redirect_url() or reverse('board:post_list')
 
 
-class PostDetailView(FormMixin, DetailView):
-    model = Post
+class PostDetailView(AsyncUserMixin, TemplateResponseMixin, ContextMixin, View):
     template_name = 'board/post_detail.html'
-    context_object_name = 'post'
-    form_class = CommentForm
     paginate_comments_by = 5
 
-    def get_success_url(self):
-        return reverse('board:post_detail', kwargs={'pk': self.object.pk})
+    async def get_post(self):
+        try:
+            return await Post.objects.for_grid(self.request.user).aget(pk=self.kwargs['pk'])
+        except Post.DoesNotExist:
+            raise Http404
+
+    async def render_page(self, form, post=None):
+        paginator = CursorPaginator(
+            Comment.objects.filter(post_id=self.kwargs['pk']).select_related('author'),
+            self.paginate_comments_by,
+            ordering=('created_at', 'id'),
+        )
+        comments = paginator.aget_page(self.request.GET.get('cursor'))
+        if post is None:
+            # The post and its first comments are fetched concurrently.
+            post, comments = await asyncio.gather(self.get_post(), comments)
+        else:
+            comments = await comments
+        paginator.approximate_total = post.comments_count
+
+        is_following = await sync_to_async(get_graph(self.request).follows)(post.author_id)
+        return self.render_to_response(self.get_context_data(
+            object=post, post=post, comments=comments, form=form, is_following=is_following,
+        ))
+
+    async def get(self, request, *args, **kwargs):
+        return await self.render_page(CommentForm())
+
+    async def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return redirect('board:login')
+
+        post = await self.get_post()
+        form = CommentForm(request.POST)
+        if form.is_valid():
+            await sync_to_async(self.save_comment)(post, form)
+            return redirect(reverse('board:post_detail', kwargs={'pk': post.pk}))
+
+        return await self.render_page(form, post)
+
+    def save_comment(self, post, form):
+        comment = form.save(commit=False)
+        comment.author = self.request.user
+        comment.post = post
+        publish_comment(comment)
+
+
+class PostCommentListView(CursorPaginationMixin, ListView):
+    model = Comment
+    context_object_name = 'comments'
+    paginate_by = 20
+    cursor_ordering = ('created_at', 'id')
+
+    def get_queryset(self):
+        self.post_object = get_object_or_404(Post, pk=self.kwargs['pk'])
+        return self.post_object.comments.select_related('author')
+
+    def get_approximate_total(self):
+        return self.post_object.comments_count
+
+
+class UserCommentListView(CursorPaginationMixin, ListView):
+    model = Comment
+    context_object_name = 'comments'
+    paginate_by = 20
+
+    def get_queryset(self):
+        self.profile_user = get_object_or_404(User, username=self.kwargs['username'])
+        return self.profile_user.comments.select_related('post')
+
+    def get_approximate_total(self):
+        return self.profile_user.comments_count
+
+
+class HashtagView(CursorPaginationMixin, ListView):
+    model = Post
+    template_name = 'board/hashtag.html'
+    context_object_name = 'posts'
+    paginate_by = 12
+    cursor_ordering = ('-tag_created_at', '-tag_post_id')
+
+    def get_queryset(self):
+        self.hashtag = get_object_or_404(Hashtag, name=self.kwargs['name'].lower())
+        return (
+            Post.objects.for_grid(self.request.user)
+            .filter(hashtag_links__hashtag=self.hashtag)
+            .annotate(tag_created_at=F('hashtag_links__created_at'), tag_post_id=F('hashtag_links__post_id'))
+        )
+
+    def get_approximate_total(self):
+        return self.hashtag.posts_count
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-        author = self.object.author
+        context['hashtag'] = self.hashtag
+        return context
+
+
+def _in_rank_order(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+class PostSearchView(ListView):
+    model = Post
+    template_name = 'board/search_results.html'
+    context_object_name = 'posts'
+    paginate_by = 12
+    comments_limit = 10
+    hashtags_limit = 10
+    redirect_hashtags = True
+
+    def get(self, request, *args, **kwargs):
+        self.query = request.GET.get('q', '').strip()
+        if self.redirect_hashtags and self.query.startswith('#') and Hashtag.objects.filter(name=self.query[1:].lower()).exists():
+            return redirect('board:hashtag', name=self.query[1:].lower())
+        return super().get(request, *args, **kwargs)
 
-        context['is_following'] = author.followers.filter(follower=user).exists() if user.is_authenticated else False
-        context['form'] = self.get_form()
+    def get_queryset(self):
+        return Post.objects.for_grid(self.request.user)
+
+    def paginate_queryset(self, queryset, page_size):
+        backend = get_post_search()
 
-        comments_list = self.object.comments.select_related('author').order_by('created_at')
-        paginator = Paginator(comments_list, self.paginate_comments_by)
-        page_number = self.request.GET.get('page')
-        comments = paginator.get_page(page_number)
-        context['comments'] = comments
+        def fetch(offset, limit):
+            if not self.query:
+                return []
+            return _in_rank_order(queryset, backend.post_ids(self.query, offset, limit))
 
+        paginator = RankedPaginator(fetch, page_size)
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        context['comments'] = []
+        context['hashtags'] = []
+        if self.query and not self.request.GET.get('cursor'):
+            if self.comments_limit:
+                ids = get_post_search().comment_ids(self.query, 0, self.comments_limit)
+                context['comments'] = _in_rank_order(Comment.objects.select_related('author', 'post'), ids)
+            term = self.query.lstrip('#').lower()
+            if self.hashtags_limit and term and ' ' not in term:
+                context['hashtags'] = Hashtag.objects.filter(name__startswith=term).order_by('-posts_count')[:self.hashtags_limit]
         return context
 
-    def post(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return redirect('board:login')
 
-        self.object = self.get_object()
-        form = self.get_form()
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'author': post.author.username,
+        'image': post.image.url if post.image else None,
+        'description': post.description,
+        'created_at': post.created_at.isoformat(),
+        'likes_count': post.likes_count,
+        'comments_count': post.comments_count,
+        'liked': post.viewer_has_liked,
+        'url': reverse('board:post_detail', kwargs={'pk': post.pk}),
+    }
 
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.author = request.user
-            comment.post = self.object
-            comment.save()
-            return redirect(self.get_success_url())
 
-        return self.form_invalid(form)
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'post': comment.post_id,
+        'author': comment.author.username,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+    }
+
+
+def serialize_user_comment(comment):
+    # The author is the profile being viewed, so only the post is included.
+    post = comment.post
+    return {
+        'id': comment.pk,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+        'post': {
+            'id': post.pk,
+            'image': post.image.url if post.image else None,
+            'description': post.description,
+            'url': reverse('board:post_detail', kwargs={'pk': post.pk}),
+        },
+    }
+
+
+class PostListApiView(CursorJsonMixin, PostListView):
+    cache_name = None
+    serializer = staticmethod(serialize_post)
+
+
+class HomeFeedApiView(CursorJsonMixin, HomeFeedView):
+    suggestions_limit = 0
+    serializer = staticmethod(serialize_post)
+
+
+class FeedApiView(CursorJsonMixin, FeedView):
+    serializer = staticmethod(serialize_post)
+
+
+class HashtagApiView(CursorJsonMixin, HashtagView):
+    serializer = staticmethod(serialize_post)
+
+
+class PostSearchApiView(CursorJsonMixin, PostSearchView):
+    redirect_hashtags = False
+    comments_limit = 0
+    hashtags_limit = 0
+    serializer = staticmethod(serialize_post)
+
+
+class PostCommentListApiView(CursorJsonMixin, PostCommentListView):
+    serializer = staticmethod(serialize_comment)
+
+
+class UserCommentListApiView(CursorJsonMixin, UserCommentListView):
+    serializer = staticmethod(serialize_user_comment)
 
 
 class ToggleLikeView(LoginRequiredMixin, View):
+    # Forms send the state they want ('liked' = 1/0), so a double submit or a
+    # retried request cannot flip it back; without one the like is toggled.
     def post(self, request, pk, *args, **kwargs):
         post = get_object_or_404(Post, pk=pk)
-        user = request.user
-        if user in post.likes.all():
-            post.likes.remove(user)
-            liked = False
+        key = (request.user.pk, post.pk)
+        desired = request.POST.get('liked')
+        if desired is None:
+            liked = bool(relations.apply_likes({key: True}))
+            if not liked:
+                relations.apply_likes({key: False})
         else:
-            post.likes.add(user)
-            liked = True
+            liked = desired == '1'
+            relations.apply_likes({key: liked})
+        post.refresh_from_db(fields=['likes_count'])
 
         next_url = request.POST.get('next') or reverse('board:post_list')
 
@@ -224,26 +464,64 @@ class ToggleLikeView(LoginRequiredMixin, View):
             return redirect(next_url)
 
 
-class ToggleFollowView(LoginRequiredMixin, View):
+class ToggleFollowView(RedirectBackMixin, LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
         target_user = get_object_or_404(User, pk=pk)
 
         if request.user == target_user:
             return redirect('board:user_detail', username=target_user.username)
 
-        follow_relation = Follow.objects.filter(follower=request.user, following=target_user).first()
-
-        if follow_relation:
-            follow_relation.delete()
-            action = 'unfollowed'
+        key = (request.user.pk, target_user.pk)
+        desired = request.POST.get('following')
+        if desired is None:
+            following = bool(relations.apply_follows({key: True}))
+            if not following:
+                relations.apply_follows({key: False})
         else:
-            Follow.objects.create(follower=request.user, following=target_user)
-            action = 'followed'
+            following = desired == '1'
+            relations.apply_follows({key: following})
+        get_graph(request).invalidate()
 
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            return JsonResponse({'status': 'ok', 'action': action})
+            return JsonResponse({'status': 'ok', 'action': 'followed' if following else 'unfollowed'})
+
+        return redirect(self.get_redirect_url() or reverse('board:user_detail', kwargs={'username': target_user.username}))
+
 
-        return redirect('board:user_detail', username=target_user.username)
+class LikeApiView(AsyncUserMixin, View):
+    # PUT likes, DELETE unlikes. Both are idempotent and go through the
+    # write-behind buffer, so the response only confirms the requested state.
+    login_required = True
+
+    async def put(self, request, pk, *args, **kwargs):
+        return await self.set_state(pk, True)
+
+    async def delete(self, request, pk, *args, **kwargs):
+        return await self.set_state(pk, False)
+
+    async def set_state(self, pk, liked):
+        if not await Post.objects.filter(pk=pk).aexists():
+            return JsonResponse({'error': 'Пост не найден'}, status=404)
+        await relations.like_buffer.aput((self.request.user.pk, pk), liked)
+        return JsonResponse({'liked': liked}, status=202)
+
+
+class FollowApiView(AsyncUserMixin, View):
+    login_required = True
+
+    async def put(self, request, pk, *args, **kwargs):
+        return await self.set_state(pk, True)
+
+    async def delete(self, request, pk, *args, **kwargs):
+        return await self.set_state(pk, False)
+
+    async def set_state(self, pk, following):
+        if pk == self.request.user.pk:
+            return JsonResponse({'error': 'Нельзя подписаться на себя'}, status=400)
+        if not await User.objects.filter(pk=pk).aexists():
+            return JsonResponse({'error': 'Пользователь не найден'}, status=404)
+        await relations.follow_buffer.aput((self.request.user.pk, pk), following)
+        return JsonResponse({'following': following}, status=202)
 
 
 class UserSearchView(ListView):
@@ -253,11 +531,138 @@ class UserSearchView(ListView):
     paginate_by = 8
 
     def get_queryset(self):
-        query = self.request.GET.get('q', '')
+        query = self.request.GET.get('q', '').strip()
         if query:
-            return User.objects.filter(
-                Q(username__icontains=query) |
-                Q(email__icontains=query) |
-                Q(first_name__icontains=query)
-            ).distinct()
+            return get_user_search().search(query)
         return User.objects.none()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        get_graph(self.request).prefetch(user.pk for user in context['users'])
+        return context
+
+
+class SuggestedUsersView(LoginRequiredMixin, ListView):
+    template_name = 'board/suggestions.html'
+    context_object_name = 'suggested_users'
+    limit = 20
+
+    def get_queryset(self):
+        return suggestions.for_user(self.request.user, get_graph(self.request), self.limit)
+
+
+class UserAutocompleteView(View):
+    limit = 8
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({'results': []})
+
+        # Follows come from the index as well: no query per keystroke.
+        results = autocomplete.get_index().search(query, limit=self.limit, viewer_id=request.user.pk)
+        for entry in results:
+            entry['url'] = reverse('board:user_detail', kwargs={'username': entry['username']})
+        return JsonResponse({'results': results})
+
+
+class ChunkedUploadView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        filename = request.POST.get('filename', '')
+        try:
+            size = int(request.POST.get('size', 0))
+            uploads.validate_declaration(filename, size)
+        except ValueError:
+            return JsonResponse({'error': 'Некорректный размер файла'}, status=400)
+        except uploads.UploadError as exc:
+            return JsonResponse({'error': str(exc)}, status=exc.status)
+
+        session = UploadSession.objects.create(user=request.user, filename=filename, size=size)
+        return JsonResponse(self.describe(session), status=201)
+
+    @staticmethod
+    def describe(session):
+        return {
+            'id': str(session.pk),
+            'offset': session.received,
+            'size': session.size,
+            'status': session.status,
+            'chunk_size': uploads.MAX_CHUNK_SIZE,
+            'url': reverse('board:upload_chunk', kwargs={'pk': session.pk}),
+        }
+
+
+class UploadChunkView(LoginRequiredMixin, View):
+    def get_session(self):
+        return get_object_or_404(UploadSession, pk=self.kwargs['pk'], user=self.request.user, status=UploadSession.OPEN)
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(ChunkedUploadView.describe(self.get_session()))
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_session()
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Нужны заголовки Upload-Offset и Content-Length'}, status=400)
+
+        try:
+            uploads.append_chunk(session, request, offset, length)
+        except uploads.UploadError as exc:
+            if not isinstance(exc, uploads.OffsetMismatch):
+                # The earlier chunks too: cleanup_uploads only finds files
+                # through their sessions.
+                uploads.discard(session)
+                session.delete()
+            return JsonResponse({'error': str(exc), 'offset': session.received}, status=exc.status)
+
+        session.save(update_fields=['received', 'content_type', 'updated_at'])
+        return JsonResponse(ChunkedUploadView.describe(session))
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_session()
+        if session.received != session.size:
+            return JsonResponse({'error': 'Файл загружен не полностью', 'offset': session.received}, status=409)
+
+        form = PostCreateForm(request.POST)
+        form.fields['image'].required = False
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        post = form.save(commit=False)
+        post.author = request.user
+        with open(uploads.session_path(session), 'rb') as assembled:
+            post.image.save(session.filename, File(assembled), save=False)
+            publish_post(post)
+        uploads.discard(session)
+        session.status = UploadSession.COMPLETE
+        session.save(update_fields=['status', 'updated_at'])
+        return JsonResponse({'id': post.pk, 'url': reverse('board:post_detail', kwargs={'pk': post.pk})}, status=201)
+
+
+class PerformanceView(UserPassesTestMixin, TemplateView):
+    # Rolling request timings and page cache hit rates of this process
+    # (board.instrumentation, board.caching); POST clears both.
+    template_name = 'board/performance.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['views'], context['profiles'] = instrumentation.stats.summary()
+        context['cache_stats'] = [
+            {'name': name, 'hits': hits, 'misses': misses, 'ratio': hits / (hits + misses) if hits + misses else None}
+            for name, (hits, misses) in cache_stats().items()
+        ]
+        context['replicas'] = [
+            {'alias': alias, 'lag': lag, 'healthy': lag is not None and lag <= replicas.max_lag()}
+            for alias, lag in replicas.pool.status().items()
+        ]
+        return context
+
+    def post(self, request, *args, **kwargs):
+        instrumentation.stats.clear()
+        cache_hit_counts.clear()
+        return redirect('board:performance')
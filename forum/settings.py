@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'board.instrumentation.InstrumentationMiddleware',
+    'board.replicas.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +77,59 @@ WSGI_APPLICATION = 'forum.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent web workers (compare with the stock settings
+# using manage.py sqlite_benchmark):
+# - WAL lets readers run alongside the one writer.
+# - synchronous=NORMAL syncs at checkpoints only, which is still safe in WAL
+#   mode short of a power loss.
+# - mmap_size serves reads from the page cache.
+# - BEGIN IMMEDIATE takes the write lock when a transaction starts. A
+#   concurrent writer then waits up to `timeout` seconds; it does not fail
+#   with "database is locked" when a read transaction upgrades.
+# - board.sqlite queues the write transactions of one process, so a waiting
+#   writer is not starved by SQLite's polling busy handler.
+# - Connections persist for CONN_MAX_AGE seconds, so the pragmas run once
+#   per worker thread and age rather than once per request. The age is finite
+#   because under ASGI the ORM runs on sync_to_async threads, whose
+#   connections are only closed at a request boundary once they are older
+#   than this; with None they would stay open for the life of the process.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'board.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (board/replicas.py): aliases from DATABASES in
+# DATABASE_REPLICAS take the reads of safe requests. After a POST the user's
+# reads stay on the primary for REPLICA_STICKY_SECONDS. A replica whose
+# heartbeat (manage.py replica_heartbeat) is older than
+# REPLICA_MAX_LAG_SECONDS, checked every REPLICA_LAG_CHECK_INTERVAL seconds,
+# gets no reads. To try it locally with a second SQLite file:
+#
+#     DATABASES['replica'] = {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': BASE_DIR / 'db_replica.sqlite3',
+#         'TEST': {'MIRROR': 'default'},
+#     }
+#     DATABASE_REPLICAS = ['replica']
+#
+# and keep `manage.py replica_heartbeat --copy-sqlite` running.
+
+DATABASE_ROUTERS = ['board.replicas.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 5
+REPLICA_MAX_LAG_SECONDS = 2
+REPLICA_LAG_CHECK_INTERVAL = 1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,8 +170,56 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Post images and avatars go to the "media" storage, which stores each
+# distinct file once under its SHA-256 (see board/storage.py).
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'media': {
+        'BACKEND': 'board.storage.ContentAddressedStorage',
+    },
+}
+
 AUTH_USER_MODEL = 'board.User'
 
+# Login by username or email in one query and one password hash
+# (board/auth.py). A successful login rehashes the password with the first
+# entry of PASSWORD_HASHERS; the others only verify existing hashes, so the
+# fixtures' 1,000,000-iteration PBKDF2 hashes move to scrypt as users sign in.
+# With argon2-cffi installed, Argon2PasswordHasher can go first instead.
+
+AUTHENTICATION_BACKENDS = ['board.auth.UsernameOrEmailBackend']
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Page and fragment cache (board/caching.py). Version keys must be shared by
+# the web processes and the run_jobs workers, so the views cache lives on the
+# file system here; point it at django.core.cache.backends.redis.RedisCache in
+# production. Test runs use locmem for both (board/test_runner.py).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'views': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+VIEW_CACHE_ALIAS = 'views'
+VIEW_CACHE_TIMEOUT = 600
+
+TEST_RUNNER = 'board.test_runner.TestRunner'
+
 
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
@@ -133,3 +229,96 @@ LOGIN_URL = '/login/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Home timeline fan-out
+# Authors with more followers than TIMELINE_FANOUT_LIMIT are merged into
+# timelines on read instead of being pushed to every follower.
+
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL_SIZE = 50
+TIMELINE_BATCH_SIZE = 1000
+
+# Ranking of the explore feed (board/feed.py): board.feed.recency_score or
+# board.feed.engagement_score, or a dotted path to any callable(post, now).
+# The scorer orders windows of FEED_WINDOW_SIZE posts, newest first, of each
+# of the followed and other parts; a larger window ranks further back at the
+# cost of scoring more rows per request.
+
+FEED_SCORER = 'board.feed.recency_score'
+FEED_WINDOW_SIZE = 120
+
+# Background jobs (image processing, timeline fan-out) are stored in the
+# board_job table and executed by `manage.py run_jobs`. With JOBS_EAGER the
+# job runs in-process right after the request's transaction commits.
+
+JOBS_EAGER = False
+JOBS_RETRY_BASE_DELAY = 5
+JOBS_WORKER_PROCESSES = 2
+
+# Resumable chunked uploads for post images (api/uploads/). Partial files
+# live outside MEDIA_ROOT until the upload is complete.
+
+CHUNKED_UPLOAD_ROOT = BASE_DIR / 'uploads_tmp'
+UPLOAD_MAX_CHUNK_SIZE = 1024 * 1024
+POST_IMAGE_MAX_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# User search backend: board.search.users.SQLiteUserSearch (FTS5 trigram),
+# PostgresTrigramUserSearch (pg_trgm GIN) or LikeUserSearch (no index).
+
+USER_SEARCH_BACKEND = 'board.search.users.SQLiteUserSearch'
+
+# Post description / comment search: SQLitePostSearch (FTS5, bm25),
+# PostgresPostSearch (tsvector GIN) or LikePostSearch (no index).
+
+POST_SEARCH_BACKEND = 'board.search.posts.SQLitePostSearch'
+
+# In-process username prefix index behind api/users/autocomplete/.
+
+AUTOCOMPLETE_REFRESH_SECONDS = 300
+
+# Per-process LRU of users' following-id sets behind board.graph (0 disables).
+# Sets of users following more accounts than the limit are never loaded whole.
+
+SOCIAL_GRAPH_CACHE_SIZE = 10000
+SOCIAL_GRAPH_FULL_SET_LIMIT = 5000
+
+# "Возможно, вы знакомы" (board/suggestions.py), recomputed by
+# manage.py refresh_suggestions: a mutual follow scores 1, a co-liked post
+# SUGGESTIONS_LIKE_WEIGHT.
+
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_LIKE_WEIGHT = 0.25
+SUGGESTIONS_LIKE_FANOUT_LIMIT = 1000
+
+# Seconds the like/follow API buffers writes per process before applying the
+# last requested state per pair in one batch (0 applies immediately).
+
+RELATIONS_WRITE_BEHIND_WINDOW = 0.2
+
+# Multiplier for the latency budgets in board/benchmark_budgets.json
+# (manage.py benchmark, board.tests) on machines slower than the one that
+# wrote them. Query-count budgets are always exact.
+
+BENCHMARK_LATENCY_FACTOR = 1
+
+# Request instrumentation (board.instrumentation): the last
+# INSTRUMENTATION_SAMPLES requests per view are kept for the staff page
+# staff/performance/, and INSTRUMENTATION_PROFILE_RATE of requests run under
+# cProfile (0 disables), of which the last INSTRUMENTATION_PROFILES are kept.
+# Each request is also logged at INFO as one JSON line to
+# board.instrumentation. No handler is attached here, so the lines stay out of
+# runserver and test output until a deployment adds one to that logger.
+
+INSTRUMENTATION_SAMPLES = 1000
+INSTRUMENTATION_PROFILE_RATE = 0.001
+INSTRUMENTATION_PROFILES = 20
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'loggers': {
+        'board.instrumentation': {'level': 'INFO'},
+    },
+}
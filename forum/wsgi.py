@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'forum.settings')
 
 application = get_wsgi_application()
+
+# Username autocomplete answers from memory; build its index before the
+# first request instead of during one.
+from board.search import autocomplete  # noqa: E402
+
+autocomplete.get_index()